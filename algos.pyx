@@ -60,14 +60,35 @@ def floyd_warshall(adjacency_matrix):
 
 
 def get_all_edges(path, i, j):
-    cdef int k = path[i][j]
-    if k == -1:
-        return []
-    else:
-        return get_all_edges(path, i, k) + [k] + get_all_edges(path, k, j)
+    """
+    Intermediate nodes on shortest path i -> j, from Floyd-Warshall's `path` (k of last relaxation, -1 for direct edge).
+    Iterative in-order traversal with explicit stack (instead of recursion & list concatenation).
+    """
+    cdef long k
+    result = []
+    stack = [(i, j)]
+    while stack:
+        i, j = stack.pop()
+        # node entry
+        if i == -1:
+            result.append(j)
+            continue
+        k = path[i][j]
+        if k == -1:
+            continue
+        # in-order: (i, k), k, (k, j) => pushed in reverse order
+        stack.append((k, j))
+        stack.append((-1, k))
+        stack.append((i, k))
+    return result
 
 
 def gen_edge_input(max_dist, path, edge_feat):
+    """
+    Edge features along shortest path of every node pair, [n, n, max_dist, feat] (-1 for padding).
+    Paths longer than `max_dist` keep first `max_dist` hops, unreachable pairs (path >= n) are skipped.
+    (For pairs within random walks only, use `graph_utils.EdgePathEncoder` instead.)
+    """
 
     (nrows, ncols) = path.shape
     assert nrows == ncols
@@ -79,18 +100,53 @@ def gen_edge_input(max_dist, path, edge_feat):
     assert path_copy.flags['C_CONTIGUOUS']
     assert edge_feat_copy.flags['C_CONTIGUOUS']
 
+    cdef numpy.ndarray[long, ndim=2, mode='c'] P = path_copy
+    cdef numpy.ndarray[long, ndim=3, mode='c'] E = edge_feat_copy
     cdef numpy.ndarray[long, ndim=4, mode='c'] edge_fea_all = -1 * numpy.ones([n, n, max_dist_copy, edge_feat.shape[-1]], dtype=numpy.int64)
-    cdef unsigned int i, j, k, num_path, cur
+    # preallocated node buffer of one path (at most n nodes), filled by iterative traversal
+    cdef numpy.ndarray[long, ndim=1, mode='c'] nodes = numpy.empty(n + 1, dtype=numpy.int64)
+    cdef numpy.ndarray[long, ndim=2, mode='c'] stack = numpy.empty([2 * n + 2, 2], dtype=numpy.int64)
+    cdef unsigned int i, j, num_path, hop
+    cdef long top, a, b, k, num_nodes
 
     for i in range(n):
         for j in range(n):
             if i == j:
                 continue
-            if path_copy[i][j] == 510:
+            if P[i, j] >= n:
                 continue
-            path = [i] + get_all_edges(path_copy, i, j) + [j]
-            num_path = len(path) - 1
-            for k in range(num_path):
-                edge_fea_all[i, j, k, :] = edge_feat_copy[path[k], path[k+1], :]
+
+            # in-order traversal of (a, b) segments: node entries are pushed as (-1, node)
+            nodes[0] = i
+            num_nodes = 1
+            top = 0
+            stack[0, 0] = i
+            stack[0, 1] = j
+            while top >= 0:
+                a = stack[top, 0]
+                b = stack[top, 1]
+                top -= 1
+                if a == -1:
+                    nodes[num_nodes] = b
+                    num_nodes += 1
+                    continue
+                k = P[a, b]
+                if k == -1:
+                    continue
+                top += 1
+                stack[top, 0] = k
+                stack[top, 1] = b
+                top += 1
+                stack[top, 0] = -1
+                stack[top, 1] = k
+                top += 1
+                stack[top, 0] = a
+                stack[top, 1] = k
+            nodes[num_nodes] = j
+            num_nodes += 1
+
+            num_path = min(num_nodes - 1, max_dist_copy)
+            for hop in range(num_path):
+                edge_fea_all[i, j, hop, :] = E[nodes[hop], nodes[hop + 1], :]
 
     return edge_fea_all
@@ -0,0 +1,337 @@
+"""
+Benchmarks for preprocessing & training performance.
+
+    python benchmark.py --target spd --dataset ciao --num_workers 8
+        Floyd-Warshall (`algos.floyd_warshall`) vs BFS (`graph_utils.all_pairs_shortest_path_distance`),
+        checks both results match (up to `--spd_cutoff`).
+        Without `--dataset`, a random graph of `--num_nodes` nodes is used.
+
+    python benchmark.py --target startup --dataset ciao --user_seq_len 30 --item_seq_len 100
+        `MyDataset` construction & first batches, eager (whole split loaded) vs lazy (memory-mapped),
+        checks both return same samples.
+
+    python benchmark.py --target loader --dataset ciao --user_seq_len 30 --item_seq_len 100 --num_workers 4
+        DataLoader throughput (samples/sec), per-sample `__getitem__` + `default_collate` vs
+        batched `__getitems__` + `IndexBatchSampler`, checks both return same batches.
+
+    python benchmark.py --target precision --dataset ciao --user_seq_len 30 --item_seq_len 100 --num_batches 200 --device cpu
+        fp32 vs bf16 autocast (`--precision` of main.py): same seed, initial weights & batch order,
+        `--num_batches` train steps then test RMSE/MAE, train & eval throughput (samples/sec).
+
+    python benchmark.py --target memory --dataset ciao --user_seq_len 30 --item_seq_lens 100,200,300,400,500 --device cpu
+        Peak activation memory (MB) & time of one train step (forward + backward) and one eval forward,
+        for each item list length, materialized vs fused attention (`--fused_attention` of main.py).
+        Synthetic batches (no padding), model config of `--dataset` (default: ciao).
+        On CPU, memory is process peak RSS (reset with /proc/self/clear_refs, Linux only).
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from graph_utils import CSRGraph, UNREACHABLE_SPD, all_pairs_shortest_path_distance
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmarks for SocialRecFormer')
+    parser.add_argument("--target", type=str, default="spd", help="spd // startup // loader // precision // memory")
+    parser.add_argument("--dataset", type=str, default=None, help="ciao // epinions (default: random graph)")
+    parser.add_argument("--num_nodes", type=int, default=2000, help="number of nodes of random graph")
+    parser.add_argument("--avg_degree", type=float, default=4, help="average degree of random graph")
+    parser.add_argument("--spd_cutoff", type=int, default=15)
+    parser.add_argument("--num_workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--split", type=str, default="train", help="dataset split of sample store")
+    parser.add_argument("--user_seq_len", type=int, default=30)
+    parser.add_argument("--item_seq_len", type=int, default=100)
+    parser.add_argument("--return_params", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument("--num_batches", type=int, default=50, help="number of batches read after dataset construction")
+    parser.add_argument("--lazy", type=bool, default=False, help="loader benchmark with lazy (memory-mapped) dataset")
+    parser.add_argument("--compact", type=bool, default=False, help="loader benchmark with compact dataset")
+    parser.add_argument("--device", type=str, default="auto", help="auto // cpu // cuda (precision benchmark)")
+    parser.add_argument("--lr", type=float, default=1e-4, help="learning rate (precision benchmark)")
+    parser.add_argument("--item_seq_lens", type=str, default="100,200,300,400,500", help="item list lengths (memory benchmark)")
+
+    args = parser.parse_args()
+
+    return args
+
+def load_social_graph(args) -> CSRGraph:
+    """
+    Social graph of `--dataset` (trustnetwork.csv), or random graph.
+    """
+    if args.dataset is not None:
+        return CSRGraph.from_csv(os.path.join(os.getcwd(), 'dataset', args.dataset, 'trustnetwork.csv'))
+
+    rng = np.random.default_rng(args.seed)
+    num_edges = int(args.num_nodes * args.avg_degree / 2)
+    src = rng.integers(1, args.num_nodes + 1, size=num_edges)
+    dst = rng.integers(1, args.num_nodes + 1, size=num_edges)
+
+    return CSRGraph.from_edge_list(src, dst, num_nodes=args.num_nodes)
+
+def bench_spd(args):
+    import pyximport
+    pyximport.install(setup_args={"include_dirs": np.get_include()})
+    import algos
+
+    graph = load_social_graph(args)
+    n = graph.num_nodes
+    print(f"nodes: {n}, edges: {len(graph.indices) // 2}")
+
+    # dense adjacency, indexed by (id - 1)
+    adjacency = np.zeros((n, n), dtype=np.int64)
+    rows = np.repeat(np.arange(n + 1), graph.degree)
+    adjacency[rows - 1, graph.indices - 1] = 1
+
+    start_time = time.time()
+    floyd_result, _ = algos.floyd_warshall(adjacency)
+    floyd_time = time.time() - start_time
+    print(f"Floyd-Warshall: {floyd_time:.4f}s")
+
+    start_time = time.time()
+    bfs_result = all_pairs_shortest_path_distance(graph, cutoff=args.spd_cutoff, num_workers=args.num_workers)
+    bfs_time = time.time() - start_time
+    print(f"BFS (cutoff {args.spd_cutoff}, {args.num_workers} workers): {bfs_time:.4f}s (x{floyd_time / bfs_time:.1f})")
+
+    expected = np.where(floyd_result > args.spd_cutoff, UNREACHABLE_SPD, floyd_result).astype(np.uint8)
+    num_mismatch = int((expected != bfs_result).sum())
+    print(f"result match: {num_mismatch == 0} (mismatched pairs: {num_mismatch})")
+
+    return num_mismatch == 0
+
+def bench_startup(args):
+    import torch
+    from torch.utils.data import DataLoader
+    from dataset import MyDataset
+
+    if args.dataset is None:
+        raise ValueError("--dataset is required for startup benchmark (preprocessed sample store)")
+
+    batches = {}
+    for lazy in [False, True]:
+        mode = "lazy" if lazy else "eager"
+        start_time = time.time()
+        dataset = MyDataset(args.dataset, args.split, seed=args.seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params, lazy=lazy)
+        init_time = time.time() - start_time
+
+        # fixed random order, same for both modes
+        generator = torch.Generator().manual_seed(args.seed)
+        loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True, generator=generator, num_workers=args.num_workers if args.num_workers > 1 else 0)
+        start_time = time.time()
+        batches[mode] = []
+        for step, batch in enumerate(loader):
+            if step == 0:
+                first_batch_time = time.time() - start_time
+            batches[mode].append(batch)
+            if step + 1 == args.num_batches:
+                break
+        read_time = time.time() - start_time
+
+        print(f"{mode}: samples: {len(dataset)}, construction: {init_time:.4f}s, first batch: {first_batch_time:.4f}s, "
+              f"{len(batches[mode])} batches: {read_time:.4f}s (time to first batch: {init_time + first_batch_time:.4f}s)")
+
+    same = all(torch.equal(eager[key], lazy[key]) for eager, lazy in zip(batches['eager'], batches['lazy']) for key in eager)
+    print(f"result match: {same}")
+
+    return same
+
+def bench_loader(args):
+    import torch
+    from torch.utils.data import DataLoader
+    from dataset import IndexBatchSampler, MyDataset
+
+    if args.dataset is None:
+        raise ValueError("--dataset is required for loader benchmark (preprocessed sample store)")
+
+    num_workers = args.num_workers if args.num_workers > 1 else 0
+    batches = {}
+    for batched in [False, True]:
+        mode = "batched" if batched else "per-sample"
+        dataset = MyDataset(args.dataset, args.split, seed=args.seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params,
+                            lazy=args.lazy, compact=args.compact, batched=batched)
+
+        # same shuffled order for both paths (DataLoader also draws workers' base seed from generator)
+        generator = torch.Generator().manual_seed(args.seed)
+        if batched:
+            loader = DataLoader(dataset, batch_sampler=IndexBatchSampler(len(dataset), args.batch_size, shuffle=True, generator=generator),
+                                generator=generator, num_workers=num_workers, collate_fn=dataset.collate_fn)
+        else:
+            loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True, generator=generator, num_workers=num_workers, collate_fn=dataset.collate_fn)
+
+        batches[mode] = []
+        num_samples = 0
+        start_time = time.time()
+        for batch in loader:
+            batches[mode].append(batch)
+            num_samples += len(batch['user_seq'])
+            if len(batches[mode]) == args.num_batches:
+                break
+        elapsed = time.time() - start_time
+
+        print(f"{mode}: {len(batches[mode])} batches, {elapsed:.4f}s, {num_samples / elapsed:.1f} samples/sec")
+
+    same = all(torch.equal(a[key], b[key]) for a, b in zip(batches['per-sample'], batches['batched']) for key in a)
+    print(f"result match: {same}")
+
+    return same
+
+def bench_precision(args):
+    import torch
+    from torch.utils.data import DataLoader
+    from config import Config
+    from dataset import MyDataset
+    from main import masked_mse_loss
+    from models.transformer import Transformer
+    from utils import DeviceTimer, autocast_context, batch_to_device, get_device
+
+    if args.dataset is None:
+        raise ValueError("--dataset is required for precision benchmark (preprocessed sample store)")
+
+    device = get_device(args.device)
+    model_config = Config[args.dataset]["model"]
+    training_config = Config[args.dataset]["training"]
+    datasets = {split: MyDataset(args.dataset, split, seed=args.seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params,
+                                 lazy=args.lazy, compact=args.compact) for split in ['train', 'test']}
+    num_workers = args.num_workers if args.num_workers > 1 else 0
+
+    results = {}
+    for precision in ['fp32', 'bf16']:
+        torch.manual_seed(args.seed)
+        model = Transformer(**model_config).to(device)
+        optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, betas=(0.9, 0.999), eps=1e-6, weight_decay=training_config["weight_decay"])
+
+        # train: same loss as `main.train`
+        generator = torch.Generator().manual_seed(args.seed)
+        loader = DataLoader(datasets['train'], batch_size=args.batch_size, shuffle=True, generator=generator, num_workers=num_workers, collate_fn=datasets['train'].collate_fn)
+        model.train()
+        timer = DeviceTimer(device)
+        num_samples = 0
+        for step, batch in enumerate(loader):
+            if step == args.num_batches:
+                break
+            batch = batch_to_device(batch, device)
+            timer.start()
+            with autocast_context(device, precision):
+                outputs, enc_loss, dec_loss = model(batch)
+            org_loss = masked_mse_loss(batch['item_rating'], outputs)
+            new_loss = masked_mse_loss(batch['item_rating'][:, 0], outputs[:, 0])
+            loss = org_loss + new_loss * training_config["alpha"] + dec_loss * training_config["gamma"] + enc_loss * training_config["beta"]
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_value_(model.parameters(), clip_value=1)
+            optimizer.step()
+            timer.stop()
+            num_samples += len(batch['user_seq'])
+        train_throughput = num_samples / (timer.total / 1000)
+
+        # eval: RMSE / MAE of first item of each sample, as `main.eval`
+        loader = DataLoader(datasets['test'], batch_size=args.batch_size, shuffle=False, num_workers=num_workers, collate_fn=datasets['test'].collate_fn)
+        model.eval()
+        timer = DeviceTimer(device)
+        num_samples = 0
+        errors = []
+        with torch.no_grad():
+            for batch in loader:
+                batch = batch_to_device(batch, device)
+                timer.start()
+                with autocast_context(device, precision):
+                    outputs, _, _ = model(batch)
+                timer.stop()
+                num_samples += len(batch['user_seq'])
+                target = batch['item_rating'][:, 0]
+                mask = (target != 0)
+                errors.append((outputs[:, 0].float() - target.float())[mask])
+        errors = torch.cat(errors)
+        results[precision] = {
+            'rmse': torch.sqrt(torch.mean(errors ** 2)).item(),
+            'mae': torch.mean(torch.abs(errors)).item(),
+            'train': train_throughput,
+            'eval': num_samples / (timer.total / 1000),
+        }
+        print(f"{precision}: RMSE {results[precision]['rmse']:.5f}, MAE {results[precision]['mae']:.5f}, "
+              f"train {results[precision]['train']:.1f} samples/sec, eval {results[precision]['eval']:.1f} samples/sec")
+
+    fp32, bf16 = results['fp32'], results['bf16']
+    print(f"bf16 - fp32: RMSE {bf16['rmse'] - fp32['rmse']:+.5f}, MAE {bf16['mae'] - fp32['mae']:+.5f}, "
+          f"train x{bf16['train'] / fp32['train']:.2f}, eval x{bf16['eval'] / fp32['eval']:.2f}")
+
+    return results
+
+def synthetic_batch(model_config, batch_size:int, user_seq_len:int, item_seq_len:int, seed:int=42) -> dict:
+    """
+    Random batch of model inputs (`dataset.MODEL_FIELDS`) without padding, ~10% of user-item pairs rated.
+    """
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    rating = torch.randint(1, 6, (batch_size, user_seq_len, item_seq_len), generator=generator).float()
+    rated = torch.rand((batch_size, user_seq_len, item_seq_len), generator=generator) < 0.1
+
+    return {
+        'user_seq': torch.randint(1, model_config['num_user'], (batch_size, user_seq_len), generator=generator),
+        'user_degree': torch.randint(1, model_config['max_degree_user'], (batch_size, user_seq_len), generator=generator),
+        'item_list': torch.randint(1, model_config['num_item'], (batch_size, item_seq_len), generator=generator),
+        'item_degree': torch.randint(1, model_config['max_degree_item'], (batch_size, item_seq_len), generator=generator),
+        'item_rating': rating * rated,
+        'spd_matrix': torch.randint(0, model_config['max_spd_value'] + 1, (batch_size, user_seq_len, user_seq_len), generator=generator),
+    }
+
+def bench_memory(args):
+    import gc
+    import torch
+    from config import Config
+    from main import masked_mse_loss
+    from models.transformer import Transformer
+    from utils import DeviceTimer, batch_to_device, device_memory, get_device, reset_peak_memory
+
+    device = get_device(args.device)
+    model_config = dict(Config[args.dataset or 'ciao']["model"])
+    item_seq_lens = [int(length) for length in args.item_seq_lens.split(',')]
+    print(f"device: {device}, batch size: {args.batch_size}, user length: {args.user_seq_len}, heads: {model_config['num_heads']}")
+
+    results = {}
+    for item_seq_len in item_seq_lens:
+        batch = batch_to_device(synthetic_batch(model_config, args.batch_size, args.user_seq_len, item_seq_len, args.seed), device)
+        for fused in [False, True]:
+            torch.manual_seed(args.seed)
+            model = Transformer(**model_config, fused_attention=fused).to(device)
+            stats = {}
+            for mode in ['train', 'eval']:
+                model.train(mode == 'train')
+                gc.collect()
+                reset_peak_memory(device)
+                # peak right after reset == current usage (model, batch, ...)
+                baseline = device_memory(device)['peak']
+                timer = DeviceTimer(device)
+                timer.start()
+                with torch.set_grad_enabled(mode == 'train'):
+                    outputs, enc_loss, dec_loss = model(batch)
+                    if mode == 'train':
+                        loss = masked_mse_loss(batch['item_rating'], outputs) + enc_loss + dec_loss
+                        loss.backward()
+                elapsed = timer.stop()
+                stats[mode] = (device_memory(device)['peak'] - baseline, elapsed)
+                del outputs, enc_loss, dec_loss
+                model.zero_grad(set_to_none=True)
+            results[(item_seq_len, fused)] = stats
+            del model
+
+            name = "fused" if fused else "materialized"
+            print(f"item length {item_seq_len:4d}, {name:>12}: train peak {stats['train'][0]:8.1f}MB ({stats['train'][1]:8.1f}ms), "
+                  f"eval peak {stats['eval'][0]:8.1f}MB ({stats['eval'][1]:8.1f}ms)")
+
+    return results
+
+BENCHMARKS = {
+    "spd": bench_spd,
+    "startup": bench_startup,
+    "loader": bench_loader,
+    "precision": bench_precision,
+    "memory": bench_memory,
+}
+
+if __name__ == "__main__":
+    args = get_args()
+    BENCHMARKS[args.target](args)
@@ -8,10 +8,15 @@ data_utils.py에 있는 함수들을 사용해
 
 import argparse
 import os
+from functools import partial
 
 import data_utils as utils
+import model_utils
+from graph_utils import CSRGraph
+from pipeline import Pipeline, Scheduler, Stage
+from store_utils import RATING_STORE_FILE, SPD_STORE_FILE, sample_data_name
 
-def get_args():
+def get_args(argv:list=None):
     parser = argparse.ArgumentParser(description='Data preparation(preprocess) for Transformer input')
     parser.add_argument("--dataset", type=str, default="epinions", help="ciao // epinions")
     parser.add_argument("--first", type=bool, default=False, help="first preprocess to make filtered .csv files")
@@ -20,54 +25,109 @@ def get_args():
     parser.add_argument("--random_walk_len", type=int, default=50, help="random walk seqeunce length (encoder's input length)")
     parser.add_argument("--item_seq_len", type=int, default=50, help="item list length (decoder's input length)")
     parser.add_argument("--return_params", type=int, default=1)
-
-    args = parser.parse_args()
+    parser.add_argument("--num_workers", type=int, default=1, help="number of processes used in random walk & SPD generation")
+    parser.add_argument("--spd_method", type=str, default="bfs", help="floyd // bfs (shortest path distance algorithm)")
+    parser.add_argument("--spd_cutoff", type=int, default=15, help="max SPD value computed in bfs & lazy mode (max_spd_value)")
+    parser.add_argument("--spd_mode", type=str, default="store", help="store // lazy (compute SPD only for users in random walks)")
+    parser.add_argument("--spd_cache_size", type=int, default=4096, help="number of cached BFS source users in lazy SPD mode")
+    parser.add_argument("--force", type=bool, default=False, help="rebuild all stages, even if up to date")
+    parser.add_argument("--num_jobs", type=int, default=1, help="number of preprocessing stages run concurrently (e.g. train & test splits)")
+    parser.add_argument("--memory_budget", type=float, default=None, help="max total memory (MB) of concurrently running stages")
+    parser.add_argument("--job_memory", type=float, default=0, help="estimated memory (MB) of each stage, used with --memory_budget")
+    parser.add_argument("--item_order", type=str, default="set", help="set // first (order of de-duplicated item list, first: reproducible across python versions)")
+    parser.add_argument("--compact_samples", type=bool, default=False, help="save only id sequences per sample (rating & SPD blocks are gathered per batch when loading)")
+
+    args = parser.parse_args(argv)
 
     return args
 
-def main():
-    args = get_args()
-
-    data_path = os.getcwd() + '/dataset/' + args.dataset
+def build_pipeline(args, data_path:str) -> Pipeline:
+    """
+    Preprocessing stage graph:
+        mat (--first) -> split -> social_{split} -> walk_{split} ----------> samples_{split}
+                               -> interaction_{split} ------------------->
+                     spd (store mode) ---------------------------------->
+    """
+    pipeline = Pipeline(data_path)
+    seed = args.seed
+    splits = ['train', 'test']      # 'valid' is not used
 
     ############# .mat 파일 전처리 (처음 1번만 실행)
     if args.first:
-        utils.mat_to_csv(data_path)
+        mat_files = ['rating.mat' if args.dataset == 'ciao' else 'rating_with_timestamp.mat', 'trustnetwork.mat']
+        pipeline.add(Stage('mat', lambda: utils.mat_to_csv(data_path),
+                           outputs=['rating.csv', 'trustnetwork.csv', RATING_STORE_FILE], sources=mat_files))
     #############
 
     ############ train/valid/test 생성
-    utils.shuffle_and_split_dataset(data_path, test=args.test_ratio, seed=args.seed)
+    pipeline.add(Stage('split', lambda: utils.shuffle_and_split_dataset(data_path, test=args.test_ratio, seed=seed, overwrite=True),
+                       outputs=[f'rating_{split}_seed_{seed}.csv' for split in ['train', 'valid', 'test']],
+                       params={'seed': seed, 'test_ratio': args.test_ratio}, sources=['rating.csv']))
     #############
 
-    ############# random walk sequence를 생성하기 위한 전처리
-    utils.generate_social_dataset(data_path, save_flag=True, seed=args.seed, split='train')
-    utils.generate_social_dataset(data_path, save_flag=True, seed=args.seed, split='test')
-    #utils.generate_social_dataset(data_path, save_flag=True, seed=args.seed, split='valid')
+    for split in splits:
+        ############# random walk sequence를 생성하기 위한 전처리
+        pipeline.add(Stage(f'social_{split}', partial(build_social_tables, data_path, split, seed),
+                           outputs=[f'trustnetwork_{split}_seed_{seed}.csv', f'degree_table_social_{split}_seed_{seed}.csv', f'degree_table_social_{split}_seed_{seed}.npy'],
+                           params={'split': split}, deps=['split'], sources=['trustnetwork.csv']))
+
+        pipeline.add(Stage(f'interaction_{split}', partial(utils.generate_interacted_items_table, data_path, split=split, seed=seed),
+                           outputs=[f'user_item_interaction_{split}_seed_{seed}.csv', f'degree_table_item_{split}_seed_{seed}.csv', f'degree_table_item_{split}_seed_{seed}.npy'],
+                           params={'split': split}, deps=['split']))
+        #############
+
+        ############# random walk sequence 생성 (동일한 seed & walk length면 item length가 달라도 재사용)
+        pipeline.add(Stage(f'walk_{split}', partial(utils.generate_social_random_walk_sequence, data_path, walk_length=args.random_walk_len, save_flag=True, all_node=True, data_split_seed=seed, split=split, return_params=args.return_params, num_workers=args.num_workers),
+                           outputs=partial(random_walk_outputs, args, data_path, split),
+                           params={'walk_length': args.random_walk_len, 'return_params': args.return_params}, deps=[f'social_{split}']))
+        #############
+
+    ############# 전체 social graph의 SPD matrix 생성 (lazy mode에선 생략)
+    if args.spd_mode == 'store':
+        pipeline.add(Stage('spd', lambda: model_utils.find_shortest_path_distance(data_path, method=args.spd_method, cutoff=args.spd_cutoff, num_workers=args.num_workers, overwrite=True),
+                           outputs=[SPD_STORE_FILE], params={'method': args.spd_method, 'cutoff': args.spd_cutoff}, sources=['trustnetwork.csv']))
+    #############
 
-    utils.generate_user_degree_table(data_path, split='train', seed=args.seed)
-    utils.generate_user_degree_table(data_path, split='test', seed=args.seed)
-    #utils.generate_user_degree_table(data_path, split='valid', seed=args.seed)
+    ############# 모델 입력을 위한 최종 데이터셋 구성
+    sample_params = {'item_seq_len': args.item_seq_len, 'spd_mode': args.spd_mode, 'spd_cutoff': args.spd_cutoff, 'item_order': args.item_order}
+    if args.compact_samples:
+        # full stores keep their previous key (no rebuild), compact stores are written to separate `_compact` directories
+        sample_params['compact'] = True
+    for split in splits:
+        store_name = sample_data_name(seed, args.random_walk_len, args.item_seq_len, args.return_params, split, compact=args.compact_samples)
+        pipeline.add(Stage(f'samples_{split}', partial(build_samples, args, data_path, split, pipeline),
+                           outputs=[store_name + '/manifest.json'],
+                           params=sample_params,
+                           deps=[f'walk_{split}', f'interaction_{split}'] + (['spd'] if args.spd_mode == 'store' else []),
+                           sources=['rating.csv']))
+    #############
 
-    utils.generate_item_degree_table(data_path, split='train', seed=args.seed)
-    utils.generate_item_degree_table(data_path, split='test', seed=args.seed)
-    #utils.generate_item_degree_table(data_path, split='valid', seed=args.seed)
+    return pipeline
 
-    utils.generate_interacted_items_table(data_path, split='train', seed=args.seed)
-    utils.generate_interacted_items_table(data_path, split='test', seed=args.seed)
-    #utils.generate_interacted_items_table(data_path, split='valid', seed=args.seed)
-    #############
+def build_social_tables(data_path:str, split:str, seed:int):
+    utils.generate_social_dataset(data_path, save_flag=True, seed=seed, split=split)
+    utils.generate_user_degree_table(data_path, split=split, seed=seed)
 
-    ############# random walk sequence 생성
-    utils.generate_social_random_walk_sequence(data_path, walk_length=args.random_walk_len, save_flag=True, all_node=True, data_split_seed=args.seed, split='train', regenerate=True, return_params=args.return_params)
-    utils.generate_social_random_walk_sequence(data_path, walk_length=args.random_walk_len, save_flag=True, all_node=True, data_split_seed=args.seed, split='test', regenerate=True, return_params=args.return_params)
-    #utils.generate_social_random_walk_sequence(data_path, walk_length=args.random_walk_len, save_flag=True, all_node=True, data_split_seed=args.seed, split='valid', regenerate=True, return_params=args.return_params)
-    #############
+def random_walk_outputs(args, data_path:str, split:str) -> list:
+    # random walk 파일명에는 (split된) social graph의 사용자 수가 포함됨
+    trust_file = data_path + f'/trustnetwork_{split}_seed_{args.seed}.csv'
+    num_nodes = len(CSRGraph.from_csv(trust_file).nodes())
 
-    ############# 모델 입력을 위한 최종 데이터셋 구성
-    utils.generate_input_sequence_data(data_path=data_path, seed=args.seed, split='train', random_walk_len=args.random_walk_len, item_seq_len=args.item_seq_len, return_params=args.return_params)
-    utils.generate_input_sequence_data(data_path=data_path, seed=args.seed, split='test', random_walk_len=args.random_walk_len, item_seq_len=args.item_seq_len, return_params=args.return_params)
-    #utils.generate_input_sequence_data(data_path=data_path, seed=args.seed, split='valid', random_walk_len=args.random_walk_len, item_seq_len=args.item_seq_len)
-    #############
+    return [utils.random_walk_file_name(num_nodes, args.random_walk_len, args.return_params, split, args.seed)]
+
+def build_samples(args, data_path:str, split:str, pipeline:Pipeline):
+    walk_file = os.path.basename(pipeline.outputs(f'walk_{split}')[0])
+    utils.generate_input_sequence_data(data_path=data_path, seed=args.seed, split=split, random_walk_len=args.random_walk_len, item_seq_len=args.item_seq_len, return_params=args.return_params, spd_mode=args.spd_mode, spd_cutoff=args.spd_cutoff, spd_cache_size=args.spd_cache_size, item_order=args.item_order, walk_file=walk_file, compact=args.compact_samples)
+
+def main():
+    args = get_args()
+
+    data_path = os.getcwd() + '/dataset/' + args.dataset
+
+    # 입력 & parameter가 바뀐 stage와 그 하위 stage만 다시 생성 (train/test처럼 독립된 stage는 동시에 실행)
+    scheduler = Scheduler(num_workers=args.num_jobs, memory_budget=args.memory_budget, job_memory=args.job_memory)
+    scheduler.add(build_pipeline(args, data_path))
+    scheduler.run(force=args.force)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
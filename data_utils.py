@@ -8,21 +8,21 @@ trustnetwork 에서 random walk sequence 생성
     - [노드, 노드, 노드], [degree, degree, dgree] 를 함께 구성 (like PyG's edge_index)
         => [[node1, node2, node3]]
 """
+import json
 import math
 import os
-import pickle
 import random
-import networkx as nx
+import time
 import numpy as np
 import pandas as pd
 import scipy.sparse as sp
-from ast import literal_eval    # convert str type list to original type
 from scipy.io import loadmat
 from tqdm.auto import tqdm
 from collections import defaultdict
 from sklearn.utils import shuffle
-import torch
-from scipy import sparse
+
+from graph_utils import CSRGraph, LazySPDTable, UserItemIndex, distinct_degree, node_degree, sharded_random_walk
+from store_utils import RATING_STORE_FILE, SAMPLE_SHARD_SIZE, RatingStore, SampleStoreWriter, load_degree_lookup, load_rating_store, load_spd_store, sample_data_name, sample_fields, save_degree_lookup
 
 # arg(or else) passing to DATASET later
 # DATASET = 'ciao'
@@ -39,48 +39,48 @@ def mat_to_csv(data_path:str):
         data_path: Path to .mat file
     """
     dataset_name = data_path.split('/')[-1]
+    stage_time = time.time()
 
-    # load .mat file & convert to dataframe
+    # load .mat file & take only used columns (user, product, rating) as arrays
+        # rating.mat: [user, product, category, rating, helpfulness]
+        # rating_with_timestamp.mat: [user, product, category, rating, helpfulness, timestamp]
     if dataset_name == 'ciao':
-        rating_file = loadmat(data_path + '/' + 'rating.mat')
-        rating_file = rating_file['rating'].astype(np.int64)
-        rating_df = pd.DataFrame(rating_file, columns=['user_id', 'product_id', 'category_id', 'rating', 'helpfulness'])
-
-        # drop unused columns (TODO: Maybe used later)
-        rating_df.drop(['category_id', 'helpfulness'], axis=1, inplace=True)
+        rating_file = loadmat(data_path + '/' + 'rating.mat')['rating']
     elif dataset_name == 'epinions':
-        rating_file = loadmat(data_path + '/' + 'rating_with_timestamp.mat')
-        rating_file = rating_file['rating_with_timestamp'].astype(np.int64)
-        rating_df = pd.DataFrame(rating_file, columns=['user_id', 'product_id', 'category_id', 'rating', 'helpfulness', 'timestamp'])
-
-        # drop unused columns (TODO: Maybe used later)
-        rating_df.drop(['category_id', 'helpfulness', 'timestamp'], axis=1, inplace=True)
-    
-    trust_file = loadmat(data_path + '/' + 'trustnetwork.mat')
-    trust_file = trust_file['trustnetwork'].astype(np.int64)    
+        rating_file = loadmat(data_path + '/' + 'rating_with_timestamp.mat')['rating_with_timestamp']
+    rating_df = pd.DataFrame({
+        'user_id': rating_file[:, 0].astype(np.int64),
+        'product_id': rating_file[:, 1].astype(np.int64),
+        'rating': rating_file[:, 3].astype(np.int64),
+    })
+
+    trust_file = loadmat(data_path + '/' + 'trustnetwork.mat')['trustnetwork'].astype(np.int64)
     trust_df = pd.DataFrame(trust_file, columns=['user_id_1', 'user_id_2'])
+    print(f"load .mat: {time.time() - stage_time:.4f}s ({len(rating_df)} ratings, {len(trust_df)} trusts)")
 
     ### data filtering & id-rearrange ###
+    stage_time = time.time()
     rating_df, trust_df = reset_and_filter_data(rating_df, trust_df)
+    print(f"filter & id re-arrange: {time.time() - stage_time:.4f}s")
     ### data filtering & id-rearrange ###
 
-    # 전체 user-item rating 정보를 담은 rating matrix 생성
-    rating_matrix = sparse.lil_matrix((max(rating_df['user_id'].unique())+1, max(rating_df['product_id'].unique())+1), dtype=np.uint16)
-
-    for index in rating_df.index:
-        rating_matrix[rating_df['user_id'][index], rating_df['product_id'][index]] = rating_df['rating'][index]
-    rating_matrix = rating_matrix.toarray()
-    np.save(data_path + '/rating_matrix.npy', rating_matrix)
-
+    # 전체 user-item rating 정보를 담은 rating matrix 생성 (중복된 (user, item)은 마지막 rating 사용)
+    # 대부분이 0이므로 dense matrix (epinions: 18098 x 261679) 대신 sparse matrix로 저장
+    stage_time = time.time()
+    rating_store = RatingStore.from_interactions(rating_df['user_id'].values, rating_df['product_id'].values, rating_df['rating'].values)
+    rating_store.save(data_path + '/' + RATING_STORE_FILE)
+    print(f"rating matrix {rating_store.matrix.shape}: {time.time() - stage_time:.4f}s")
 
     # 저장되는 .csv 파일은 user filter & id re-arrange가 완료된 .csv 파일
     # 따라서 이 함수가 한번 실행된 이후로는 사용 X.
+    stage_time = time.time()
     rating_df.to_csv(data_path + '/rating.csv', index=False)
     trust_df.to_csv(data_path + '/trustnetwork.csv', index=False)
+    print(f"save .csv: {time.time() - stage_time:.4f}s")
 
     print(".mat file converting finished...")
 
-def shuffle_and_split_dataset(data_path:str, test=0.1, seed=42):
+def shuffle_and_split_dataset(data_path:str, test=0.1, seed=42, overwrite:bool=False):
     """
     Split rating.csv file into train/valid/test.
     
@@ -88,8 +88,9 @@ def shuffle_and_split_dataset(data_path:str, test=0.1, seed=42):
         data_path: Path to dataset (ciao or epinions)
         test: percentage of test & valid dataset (default: 10%)
         seed: random seed (default=42)
+        overwrite: split again even if splitted data exists (default=False)
     """
-    if f'rating_train_seed_{seed}.csv' in os.listdir(data_path):
+    if not overwrite and f'rating_train_seed_{seed}.csv' in os.listdir(data_path):
         print(f"splitted data exists, seed: {seed} ")
         return 0
     
@@ -118,52 +119,29 @@ def reset_and_filter_data(rating_df:pd.DataFrame, trust_df:pd.DataFrame) -> pd.D
     This function is used in `mat_to_csv()`. 
     (`find_non_existing_user_in_social_graph()` is deprecated & merged into this function.)
 
+    New ids follow the order of first appearance (same order as nodes of `nx.from_pandas_edgelist()`):
+        users: in trust edges (user_id_1, user_id_2 of each edge in turn)
+        items: in remaining ratings
+
     Args:
         rating_df: originally loaded `rating_df` (user-item interaction data)
         trust_df: originaly loaded `trust_df` (social data)
     """
-    social_network = nx.from_pandas_edgelist(trust_df, source='user_id_1', target='user_id_2')
-
-    social_ids = []
-    for user_id in social_network.nodes():
-        social_ids.append(user_id)
-    
-    user_item_ids = rating_df['user_id'].unique().tolist()
-
-    # Find users not exists in social data
-    non_users = np.setxor1d(user_item_ids, social_ids)
+    # social users in order of appearance: [u1, v1, u2, v2, ...]
+    social_ids = pd.unique(trust_df[['user_id_1', 'user_id_2']].values.ravel())
 
     # Remove users not exists in social data
         # Ciao: 7375 user (user-item) ==> 7317 user (social)
         # Epinions: 22164 user (user-item) ==> 18098 user (social)
-    rating_df = rating_df[~rating_df['user_id'].isin(non_users.tolist())].copy()
-
-    # Generate user id mapping table
-    mapping_table_user = {}
-    new_id_user = 1
-    for item in social_ids:
-        mapping_table_user[item] = new_id_user
-        new_id_user += 1
-    
-    # Generate item id mapping table
-    mapping_table_item = {}
-    new_id_item = 1
-    for item in rating_df['product_id'].unique().tolist():
-        mapping_table_item[item] = new_id_item
-        new_id_item += 1
-    # print("before replace")
-    # Replace user id & item id, using id mapping table.
-    # print(rating_df.head())
-    # print(mapping_table_item)
-    # rating_df = rating_df.replace({'user_id': mapping_table_user, 'product_id':mapping_table_item})
-    # print("after rating")
-    # trust_df = trust_df.replace({'user_id_1': mapping_table_user, 'user_id_2': mapping_table_user})
-    # print("after repl")
-
-    rating_df['user_id']= rating_df['user_id'].map(mapping_table_user)
-    rating_df['product_id'] = rating_df['product_id'].map(mapping_table_item)
-    trust_df['user_id_1']= trust_df['user_id_1'].map(mapping_table_user)
-    trust_df['user_id_2'] = trust_df['user_id_2'].map(mapping_table_user)
+    rating_df = rating_df[rating_df['user_id'].isin(social_ids)].copy()
+
+    # Replace user id & item id (1, 2, 3, ...)
+    user_index = pd.Index(social_ids)
+    rating_df['user_id'] = user_index.get_indexer(rating_df['user_id'].values) + 1
+    rating_df['product_id'] = pd.factorize(rating_df['product_id'].values)[0] + 1
+    trust_df['user_id_1'] = user_index.get_indexer(trust_df['user_id_1'].values) + 1
+    trust_df['user_id_2'] = user_index.get_indexer(trust_df['user_id_2'].values) + 1
+
     return rating_df, trust_df
 
 def generate_social_dataset(data_path:str, save_flag:bool = False, seed:int = 42, split:str='train'):
@@ -200,12 +178,14 @@ def generate_user_degree_table(data_path:str, split:str='train', seed:int=42) ->
     # trust_file = data_path + f'/trustnetwork.csv'
     dataframe = pd.read_csv(trust_file, index_col=[])
 
-    social_graph = nx.from_pandas_edgelist(dataframe, source='user_id_1', target='user_id_2')
+    # networkx graph 대신 edge array에 np.bincount (nx.Graph.degree()와 동일: 중복 & 역방향 edge는 1번, self-loop는 2)
+        # id로 바로 indexing 가능한 degree array (.npy)를 .csv 옆에 함께 저장
+    degree = node_degree(dataframe['user_id_1'].values, dataframe['user_id_2'].values)
+    save_degree_lookup(data_path + f'/degree_table_social_{split}_seed_{seed}.csv', degree)
 
-    degrees = {node: val for (node, val) in social_graph.degree()}
-    degree_df = pd.DataFrame(degrees.items(), columns=['user_id', 'degree'])
-
-    degree_df.sort_values(by='user_id', ascending=True, inplace=True)
+    # user_id 오름차순, graph에 존재하는 사용자만
+    nodes = np.union1d(dataframe['user_id_1'].values, dataframe['user_id_2'].values)
+    degree_df = pd.DataFrame({'user_id': nodes, 'degree': degree[nodes]})
 
     degree_df.to_csv(data_path + f'/degree_table_social_{split}_seed_{seed}.csv', index=False)
     # degree_df.to_csv(data_path + f'/degree_table_social.csv', index=False)
@@ -233,12 +213,12 @@ def generate_item_degree_table(data_path:str, split:str='train', seed:int=42) ->
     dataframe = pd.read_csv(rating_file, index_col=[])
 
     # Since using NetworkX to compute bipartite graph's degree is time-consuming(because graph is too sparse),
-    # we just use pandas for simple degree calculation.
-    degree_df = dataframe.groupby('product_id')['user_id'].nunique().reset_index()
-    # degree_df = dataframe.groupby('user_id')['product_id'].nunique().reset_index()
+    # we just count distinct users of each item with np.bincount. (same as groupby('product_id')['user_id'].nunique())
+    degree = distinct_degree(dataframe['product_id'].values, dataframe['user_id'].values)
+    save_degree_lookup(data_path + f'/degree_table_item_{split}_seed_{seed}.csv', degree)
 
-    degree_df.columns = ['product_id', 'degree']
-    # degree_df.columns = ['user_id', 'degree']
+    items = np.flatnonzero(degree)
+    degree_df = pd.DataFrame({'product_id': items, 'degree': degree[items]})
 
     degree_df.to_csv(data_path + f'/degree_table_item_{split}_seed_{seed}.csv', index=False)
     # degree_df.to_csv(data_path + f'/degree_table_item.csv', index=False)
@@ -262,11 +242,11 @@ def generate_interacted_items_table(data_path:str, split:str='train', seed:int=4
         rating_file = data_path + f'/rating_{split}_seed_{seed}.csv'
     
     dataframe = pd.read_csv(rating_file, index_col=[])
-    degree_table = generate_item_degree_table(data_path=data_path, split=split, seed=seed)
-    degree_table = dict(zip(degree_table['product_id'], degree_table['degree']))    # for id mapping.
+    generate_item_degree_table(data_path=data_path, split=split, seed=seed)
+    item_degree = load_degree_lookup(data_path + f'/degree_table_item_{split}_seed_{seed}.csv')      # for id mapping.
 
-    user_item_dataframe = dataframe.groupby('user_id').agg({'product_id': list, 'rating': list}).reset_index()
-    user_item_dataframe['product_degree'] = user_item_dataframe['product_id'].apply(lambda x: [degree_table[id] for id in x])
+    dataframe['product_degree'] = item_degree[dataframe['product_id'].values]
+    user_item_dataframe = dataframe.groupby('user_id').agg({'product_id': list, 'rating': list, 'product_degree': list}).reset_index()
 
     # This is for indexing 0, where random walk sequence has padded with 0.
         # minimum number of interacted item is 4(before dataset splitting), so pad it to 4.
@@ -311,7 +291,13 @@ def generate_interacted_users_table(data_path:str, split:str='train', seed:int=4
 
 
 
-def generate_social_random_walk_sequence(data_path:str, num_nodes:int=10, walk_length:int=5, save_flag:bool=False, all_node:bool=False, data_split_seed:int=42, split:str='train', regenerate:bool=False, return_params:int=1) -> list:
+def random_walk_file_name(num_nodes:int, walk_length:int, return_params:int, split:str, seed:int) -> str:
+    """
+    File name of random walk sequences saved by `generate_social_random_walk_sequence()`.
+    """
+    return f"social_user_{num_nodes}_rw_length_{walk_length}_rp_{return_params}_split_{split}_seed_{seed}.csv"
+
+def generate_social_random_walk_sequence(data_path:str, num_nodes:int=10, walk_length:int=5, save_flag:bool=False, all_node:bool=False, data_split_seed:int=42, split:str='train', regenerate:bool=False, return_params:int=1, num_workers:int=1) -> list:
     """
     Generate random walk sequence from social graph(trustnetwork).
     Return:
@@ -331,16 +317,19 @@ def generate_social_random_walk_sequence(data_path:str, num_nodes:int=10, walk_l
         seed: random seed, True or False (default=False)
         split: dataset split type (default=train)
         regenerate: to generate random walk sequence once again (default=False)
+        return_params: probability (x10) of returning to previous node
+        num_workers: number of processes generating random walks (default=1)
     """
     trust_file = data_path + f'/trustnetwork_{split}_seed_{data_split_seed}.csv'
-    dataframe = pd.read_csv(trust_file, index_col=0)
-    social_graph = nx.from_pandas_edgelist(dataframe, source='user_id_1', target='user_id_2')
-    degree_table = generate_user_degree_table(data_path=data_path, split=split, seed=data_split_seed)
+    social_graph = CSRGraph.from_csv(trust_file)
+    generate_user_degree_table(data_path=data_path, split=split, seed=data_split_seed)
 
-    all_path_list = []
+    # id-indexed degree lookup table (0 for zero-padded node)
+    degree_lookup = load_degree_lookup(data_path + f'/degree_table_social_{split}_seed_{data_split_seed}.csv')
 
+    nodes = social_graph.nodes()
     if all_node:
-        num_nodes = len(social_graph.nodes())
+        num_nodes = len(nodes)
     
     
     # processed file check
@@ -348,126 +337,46 @@ def generate_social_random_walk_sequence(data_path:str, num_nodes:int=10, walk_l
     # generate_inpute_sequence_data()는 이 함수에서 생성된 랜덤워크 시퀀스를 사용하므로
     # 동일한 seed, user length에 item length만 다르다면 랜덤워크 시퀀스를 다시 생성하지 않도록 설정.
     if regenerate:
-        if f"social_user_{num_nodes}_rw_length_{walk_length}_rp_{return_params}_split_{split}_seed_{data_split_seed}.csv" not in os.listdir(data_path):
+        if random_walk_file_name(num_nodes, walk_length, return_params, split, data_split_seed) not in os.listdir(data_path):
             print("No random walk found, proceed generating...")
         else:
             print(f"Generated random walk already exists: user_seq_{walk_length}_split_{split}_seed_{data_split_seed}")
             return 0
 
+    # random walk는 data_split_seed로 seeding => 동일한 seed에서 항상 동일한 random walk sequence 생성.
+        # (shard 마다 (data_split_seed, shard_id)로 RNG를 만들어서 worker 수와 무관하게 동일한 결과)
+    rng = np.random.default_rng(data_split_seed)
+
     # select target(anchor) nodes randomly. (without replacement)
-    # if split == "train":
-    #     anchor_nodes = np.random.choice(social_graph.nodes(), size=num_nodes*2, replace=True)
-    # else:
-    anchor_nodes = np.random.choice(social_graph.nodes(), size=num_nodes, replace=False)
+    anchor_nodes = rng.choice(nodes, size=num_nodes, replace=False)
     if split == "train":
         anchor_nodes = np.repeat(anchor_nodes,10) ##generate multiple random sequence
     
-    # At first, there is no previous node, so set it to None.
-    for nodes in tqdm(anchor_nodes, desc="Generating random walk sequence..."):
-        path_dict = {}
-        path_dict[nodes] = [nodes]
-        # for _ in range(walk_length - 1):
-        wl = 0
-        threshold = 0
-        while wl < walk_length-1:
-            # Move to one of connected node randomly.
-            if wl == 0:
-                next_node = find_next_node(social_graph, previous_node=None, current_node=nodes, RETURN_PARAMS=0.0)
-                path_dict[nodes].append(next_node)
-                wl += 1
-
-            # If selected node was "edge node", there is no movable nodes, so pad it with 0(zero-padding).
-            elif path_dict[nodes][-1] == 0:
-                path_dict[nodes].append(0)
-                wl += 1
-
-            # Move to one of connected node randomly.
-            else:
-                next_node = find_next_node(social_graph, previous_node=path_dict[nodes][-2], current_node=path_dict[nodes][-1], RETURN_PARAMS=return_params/10)
-                if next_node in path_dict[nodes]:
-                    #print(next_node)
-                    threshold += 1
-                    if threshold > 10:
-                        path_dict[nodes].append(0)
-                        wl += 1
-                    else:
-                        continue
-                else:
-                    path_dict[nodes].append(next_node)
-                    wl += 1
-        
-        # # Get each user's degree information from degree table.
-        degree_list = []
-        for node_list in path_dict.values():
-            for node in node_list:
-                if node != 0:
-                    degree = degree_table['degree'].loc[degree_table['user_id'] == node].values[0]
-                else:
-                    # If node is 0 (zero-padded value), returns 0.
-                    degree = 0
-                degree_list.append(degree)
-        
-        # Add degree information to path_dict.
-        path_dict = {key: [value, degree_list] for key, value in path_dict.items()}
-        all_path_list.append(path_dict)
+    # [num_anchor, walk_length], dead end 이후로는 0으로 padding 됨.
+    walks = sharded_random_walk(social_graph, anchor_nodes, walk_length=walk_length, return_params=return_params/10, seed=data_split_seed, num_workers=num_workers)
 
-        
+    # Get each user's degree information from degree table. (0 for zero-padded node)
+    degrees = degree_lookup[walks]
+
+    all_path_list = [{anchor: [walk, degree]} for anchor, walk, degree in zip(anchor_nodes.tolist(), walks.tolist(), degrees.tolist())]
         
     if save_flag:
         # save result to .csv
-        path = data_path + '/' + f"social_user_{num_nodes}_rw_length_{walk_length}_rp_{return_params}_split_{split}_seed_{data_split_seed}.csv"
-
-        keys, walks, degrees = [], [], []
-        for paths in all_path_list:
-            for key, value in paths.items():
-                keys.append(key)
-                walks.append(value[0])
-                degrees.append(value[1])
+        path = data_path + '/' + random_walk_file_name(num_nodes, walk_length, return_params, split, data_split_seed)
 
         result_df = pd.DataFrame({
-            'user_id':keys,
-            'random_walk_seq':walks,
-            'degree':degrees
+            'user_id':anchor_nodes.tolist(),
+            'random_walk_seq':walks.tolist(),
+            'degree':degrees.tolist()
         })
-        result_df.sort_values(by=['user_id'], inplace=True)
+        result_df.sort_values(by=['user_id'], kind='stable', inplace=True)
         result_df.reset_index(drop=True, inplace=True)
         
         result_df.to_csv(path, index=False)
         
     return all_path_list
 
-
-def find_next_node(input_G, previous_node, current_node, RETURN_PARAMS):
-    """
-    input_G의 current_node에서 weight를 고려하여 다음 노드를 선택함. 
-    - 이 과정에서 RETURN_params를 고려함. 
-    - 이 값은 previous_node로 돌아가는가 돌아가지 않는가를 정하게 됨. 
-    """
-        
-    select_probabilities = {}
-    
-    for node in input_G.neighbors(current_node):
-        if node != previous_node:
-            select_probabilities[node] = 1   
-        
-    select_probabilities_sum = sum(select_probabilities.values())
-    select_probabilities = {k: v/select_probabilities_sum*(1-RETURN_PARAMS) for k, v in select_probabilities.items()}
-    if previous_node is not None:
-        select_probabilities[previous_node]=RETURN_PARAMS # 이 노드는 RETURN_PARAMS에 의해 결정됨. 
-    
-    # print(select_probabilities)
-    # print(select_probabilities_sum)
-    
-    if select_probabilities_sum == 0:
-        return 0
-    
-    selected_node = np.random.choice(
-        a=[k for k in select_probabilities.keys()],
-        p=[v for v in select_probabilities.values()]
-    )
-    return selected_node
-    
-def generate_input_sequence_data(data_path, seed:int, split:str='train', random_walk_len:int=20, item_seq_len:int=250, return_params:int=1):
+def generate_input_sequence_data(data_path, seed:int, split:str='train', random_walk_len:int=20, item_seq_len:int=250, return_params:int=1, spd_mode:str='store', spd_cutoff:int=15, spd_cache_size:int=4096, item_order:str='set', chunk_size:int=1024, shard_size:int=SAMPLE_SHARD_SIZE, resume:bool=True, walk_file:str=None, compact:bool=False):
 
     # if os.path.isfie(data_path + f"/sequence_data_seed_{seed}_walk_{random_walk_len}_itemlen_{item_seq_len}_{split}.pkl"):
     #     print(data_path + f"/sequence_data_seed_{seed}_walk_{random_walk_len}_itemlen_{item_seq_len}_{split}.pkl"+" file exists")
@@ -480,131 +389,112 @@ def generate_input_sequence_data(data_path, seed:int, split:str='train', random_
     split: data split type (train/valid/test)
     random_walk_len: pre-defined random walk sequence's length (used in `generate_social_random_walk_sequence()`)
     item_seq_len: pre-defined interacted item sequence length
-
-    FIXME: 현재는 .csv로 저장 중. 추후 return을 한다면 아래와 같이 return을 할 수 있게 수정?
-
-    Returns:
+    spd_mode: store // lazy
+        store: slice pre-computed SPD store (`shortest_path_result.spd`)
+        lazy: compute SPD only from users in random walks with BFS (`graph_utils.LazySPDTable`)
+    spd_cutoff: max SPD value computed in lazy mode (max_spd_value)
+    spd_cache_size: number of source users cached in lazy mode
+    item_order: order of de-duplicated item list (see `UserItemIndex.walk_items()`)
+        set: same as previous `list(set(item_list))`
+        first: order of first appearance, for reproducibility across python versions
+    chunk_size: number of random walks whose SPD matrices are gathered at once
+    shard_size: number of samples per shard of sample store (= number of samples kept in memory)
+    resume: continue from last completed shard of interrupted run (with same settings)
+    walk_file: random walk file name (default: search `data_path` for file matching split, seed, walk length & return_params)
+    compact: only save id sequences (user_id, user_seq, item_list),
+        degrees, rating & SPD blocks are gathered per batch from global tables when loading (`dataset.BlockCollate`)
+
+    Samples are saved as sample store (`store_utils.SampleStore`), directory `sequence_data_seed_..._{split}/`.
+
+    Fields (per sample):
         user_seq:       고정된 길이의 사용자 랜덤워크 시퀀스, [num_user, seq_length]\n
         user_degree:    랜덤워크 시퀀스에서 출현한 사용자들의 degree 정보, [num_user, seq_length] \n
-        item_seq:       랜덤워크 시퀀스에서 출현한 사용자들이 상호작용한 모든 아이템 리스트 \n
+        item_list:      랜덤워크 시퀀스에서 출현한 사용자들이 상호작용한 모든 아이템 리스트 \n
         item_rating:    랜덤워크 시퀀스에서 출현한 사용자들이 상호작용한 모든 아이템에 대한 rating 정보가 담긴 matrix \n
         item_degree:    선택된 아이템들의 degree 정보 (해당 아이템과 상호작용한 사용자의 수) \n
         spd_matrix:     현재 user_seq에 해당하는 사용자들의 SPD matrix (사전 생성한 전체 사용자의 SPD table에서 slicing한 matrix)
     """
-    def slice_and_pad_list(input_list:list, slice_length:int):
-        """
-        Get list, and slice it by slice length, and pad with 0.
-        """
-        num_slices = math.ceil(len(input_list) / slice_length)
-
-        # Pad input list with 0
-        input_list += [0] * (slice_length * num_slices - len(input_list))
-
-        # Create sliced & padded list
-        result_list = [input_list[i:i + slice_length] for i in range(0, len(input_list), slice_length)]
-
-        return result_list, num_slices
-
     ## FIXME: 작성한 함수를 호출하도록 추후 수정
     ########### FIXME: (231018)
     # f'_split_{split}_seed_{seed}.csv' 로 filtering 했는데, 이러면 sequence 길이가 10, 20, 30인게 모두 걸림.
     # 현재 생성되는 rw sequence 등 앞선 전처리 과정은 전부 다르게 생성되고 있음. 동일 수치가 나오는 이유가 여기가 문제인것으로 파악됨.
-    files = os.listdir(data_path)
+    # `data_making.py` 파이프라인에서는 walk stage의 출력 파일명을 `walk_file`로 직접 전달 (substring 검색 X)
+    user_path = walk_file
+    files = os.listdir(data_path) if walk_file is None else []
     for file_name in files:
         if 'social' in file_name and f'rw_length_{random_walk_len}_rp_{return_params}_split_{split}_seed_{seed}.csv' in file_name:
             user_path = file_name
     ###########
     item_path = f'user_item_interaction_{split}_seed_{seed}.csv'
-    spd_path = 'shortest_path_result.npy'
 
 
-    # Load dataset & convert data type
+    # Load random walk sequences => [num_walk, walk_len]
     user_df = pd.read_csv(data_path + '/' + user_path, index_col=[])
-    user_df['random_walk_seq'] = user_df.apply(lambda x: literal_eval(x['random_walk_seq']), axis=1)
-    user_df['degree'] = user_df.apply(lambda x: literal_eval(x['degree']), axis=1)
+    user_ids = user_df['user_id'].tolist()
+    walks = np.array([json.loads(x) for x in user_df['random_walk_seq']], dtype=np.int64)
+    walk_degrees = [json.loads(x) for x in user_df['degree']]
 
-    item_df = pd.read_csv(data_path + '/' + item_path, index_col=[])
-    item_df['product_id'] = item_df.apply(lambda x: literal_eval(x['product_id']), axis=1)
-    item_df['rating'] = item_df.apply(lambda x: literal_eval(x['rating']), axis=1)
-    item_df['product_degree'] = item_df.apply(lambda x: literal_eval(x['product_degree']), axis=1)
+    # user -> interacted items CSR index & item degree array (item_df.loc[...] 로 매번 전체 table을 scan하지 않도록)
+    item_index = UserItemIndex.from_interaction_table(data_path + '/' + item_path)
 
     # Load SPD table => 각 sequence마다 [seq_len_user, seq_len_user] 크기의 SPD matrix를 생성하도록.
-    spd_table = torch.from_numpy(np.load(data_path + '/' + spd_path)).long()
+        # (memmap된 uint8 SPD store에서 필요한 부분만 읽거나, lazy mode에선 walk에 등장한 사용자에서만 BFS)
+        # (compact mode에선 batch 단위로 DataLoader에서 생성하므로 생략)
+    if compact:
+        spd_table = None
+    elif spd_mode == 'lazy':
+        spd_table = LazySPDTable(CSRGraph.from_csv(data_path + '/trustnetwork.csv'), cutoff=spd_cutoff, cache_size=spd_cache_size)
+    else:
+        spd_table = load_spd_store(data_path)
 
     # Load rating table => 마찬가지로 각 sequence마다 [seq_len_user, seq_len_item] 크기의 rating matrix를 생성하도록.
-    # rating_table = pd.read_csv(data_path + '/' + item_rating_path, index_col=[])
-    rating_matrix = np.load(data_path + '/rating_matrix.npy')#pd.DataFrame(np.load(data_path + '/rating_matrix.npy'))
-
-    total_df = pd.DataFrame(columns=['user_id', 'user_sequences', 'user_degree', 'item_sequences', 'item_degree', 'item_rating', 'spd_matrix'])
-    for _, data in tqdm(user_df.iterrows(), total=user_df.shape[0]):
-        current_user = data['user_id']
-        current_sequence = data['random_walk_seq']
-        current_degree = data['degree']
-
-        item_indexer = [int(x) for x in current_sequence]
-        item_list, degree_list = [], []
-        user_item_list = []
-
-        # 1개의 rw sequence에 있는 사용자들이 상호작용한 모든 아이템 & 해당 아이템들의 degree 가져와서
-        for index in item_indexer:
-            if index == 0:
+        # (sparse rating store에서 (user, item) pair 단위로 lookup)
+    rating_store = load_rating_store(data_path) if not compact else None
+
+    # 고정 길이 field 별 columnar sample store로 저장 (shard_size개 sample마다 기록하므로 메모리 사용량 일정)
+        # 중간에 종료된 경우, 같은 설정이면 마지막으로 기록된 shard 다음 random walk부터 이어서 생성
+    store_name = sample_data_name(seed, random_walk_len, item_seq_len, return_params, split, compact=compact)
+    meta = {'seed': seed, 'split': split, 'return_params': return_params, 'walk_file': user_path, 'num_walks': len(walks),
+            'spd_mode': spd_mode, 'spd_cutoff': spd_cutoff, 'item_order': item_order, 'compact': compact}
+    fields = sample_fields(len(walks[0]), item_seq_len, compact=compact)
+    writer = SampleStoreWriter(data_path + '/' + store_name, fields, shard_size=shard_size, meta=meta, resume=resume)
+
+    for chunk_start in tqdm(range(writer.cursor, len(walks), chunk_size), desc="Generating input sequence data..."):
+        walk_chunk = walks[chunk_start:chunk_start + chunk_size]
+
+        # [chunk_size, seq_len_user, seq_len_user]
+        spd_chunk = spd_table.gather(walk_chunk) if not compact else None
+
+        for index, current_sequence in enumerate(walk_chunk, start=chunk_start):
+            # 1개의 rw sequence에 있는 사용자들이 상호작용한 모든 아이템 (중복 제거)
+            item_list = item_index.walk_items(current_sequence, item_order=item_order)
+
+            # 중복제거한 list를 정해진 길이 (item_seq_length) 만큼 자르고 0으로 padding => [num_slices, item_seq_len]
+            num_slices = math.ceil(len(item_list) / item_seq_len)
+            if num_slices == 0:
                 continue
-
-            item_list.extend(item_df.loc[item_df['user_id'] == index]['product_id'].values[0])
-            degree_list.extend(item_df.loc[item_df['user_id'] == index]['product_degree'].values[0])
-            user_item_list.extend([index]*len(item_df.loc[item_df['user_id'] == index]['product_id'].values[0]))
-
-        # 중복을 제거
-        item_list_removed_duplicate = list(set(item_list))
-
-        # flat_item_list 원소와 대응되는 degree를 추출
-        mapping_dict = {}
-        for item, degree in zip(item_list, degree_list):
-            if item not in mapping_dict:
-                mapping_dict[item] = degree
-        
-        # 추출한 degree를 item_list_removed_duplicate에 대응하여 list 생성
-        degree_list_removed_duplicate = [mapping_dict[item] for item in item_list_removed_duplicate]
-
-        # flat_item_list 원소와 대응되는 degree를 추출
-        user_mapping_dict = {}
-        for item, user in zip(item_list, user_item_list):
-            if item not in user_mapping_dict:
-                user_mapping_dict[item] = user
-        
-        # 중복제거한 list를 정해진 길이 (item_seq_length) 만큼 자르기
-        sliced_item_list, num_slices = slice_and_pad_list(item_list_removed_duplicate, slice_length=item_seq_len)
-        sliced_degree_list, num_slices = slice_and_pad_list(degree_list_removed_duplicate, slice_length=item_seq_len)
-
-        spd_matrix = spd_table[torch.LongTensor(current_sequence).squeeze() - 1, :][:, torch.LongTensor(current_sequence).squeeze() - 1]
-
-        # 자른 list와 위 정보들을 dataframe에 담아서 저장
-        for item_list, degree_list in zip(sliced_item_list, sliced_degree_list):
-
-            # 현재 선택된 user_seq에 있는 사용자들과 sliced item_seq에 대해 [seq_len_user, seq_len_item] 크기의 rating table 생성
-            small_rating_matrix = torch.zeros((len(current_sequence), item_seq_len), dtype=torch.long)
-            # print(len(rating_matrix[0]))
-            for i in range(small_rating_matrix.shape[0]):      # user loop (row)
-                matrix_user = current_sequence[i]
-                for j in range(small_rating_matrix.shape[1]):  # item loop (col)
-                    matrix_item = item_list[j]
-                    small_rating_matrix[i][j] = rating_matrix[matrix_user][matrix_item]#[0]
-            
-            total_df.loc[len(total_df)] = [current_user, 
-                                            current_sequence, 
-                                            current_degree, 
-                                            item_list, 
-                                            degree_list, 
-                                            small_rating_matrix,
-                                            spd_matrix]
-
-    ########################### FIXME: 초안모델 디버깅용으로 user_id=100 까지만 기록. ###########################
-        # if current_user == 100:
-        #     break
-
-    with open(data_path + f"/sequence_data_seed_{seed}_walk_{random_walk_len}_itemlen_{item_seq_len}_rp_{return_params}_{split}.pkl", "wb") as file:
-        pickle.dump(total_df, file)
-    #total_df.to_csv(data_path + f"/sequence_data_seed_{seed}_walk_{random_walk_len}_itemlen_{item_seq_len}_rp_{return_params}_{split}.csv")
+            sliced_item_list = np.zeros(num_slices * item_seq_len, dtype=np.int64)
+            sliced_item_list[:len(item_list)] = item_list
+
+            samples = {
+                'user_id': np.full(num_slices, user_ids[index]),
+                'user_seq': np.broadcast_to(current_sequence, (num_slices, len(current_sequence))),
+                'item_list': sliced_item_list.reshape(num_slices, item_seq_len),
+            }
+            if not compact:
+                # 현재 선택된 user_seq에 있는 사용자들과 모든 sliced item_seq에 대한 rating table을 한번에 생성
+                    # [seq_len_user, num_slices * item_seq_len] ==> [num_slices, seq_len_user, item_seq_len]
+                rating_block = rating_store.lookup(current_sequence[:, None], sliced_item_list[None, :])
+                samples['item_rating'] = rating_block.reshape(len(current_sequence), num_slices, item_seq_len).transpose(1, 0, 2)
+                samples['user_degree'] = np.broadcast_to(walk_degrees[index], (num_slices, len(current_sequence)))
+                samples['item_degree'] = item_index.item_degree[sliced_item_list].reshape(num_slices, item_seq_len)
+                samples['spd_matrix'] = np.broadcast_to(spd_chunk[index - chunk_start], (num_slices, *spd_chunk.shape[1:]))
+
+            # 자른 list와 위 정보들을 slice 갯수만큼 반복해서 저장
+            writer.append(samples, cursor=index + 1)
+
+    store = writer.close()
+    print(f"Saved {len(store)} samples: {store.path}")
 
 def pad_list(input_list:list, slice_length:int):
         """
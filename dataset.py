@@ -79,65 +79,468 @@ import pandas as pd
 
 #         return batch_data
         
+import math
 import os
-import pickle
-import pandas as pd
 import numpy as np
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler, default_collate, get_worker_info
+
+from graph_utils import CSRGraph, EdgePathEncoder, LazySPDTable, UserItemIndex, random_walk
+from store_utils import load_degree_lookup, load_rating_store, load_sample_store, load_spd_store, sample_data_name
+from utils import process_memory
+
+# sample store fields used as model input (same names as batch keys)
+MODEL_FIELDS = ['user_seq', 'user_degree', 'item_list', 'item_degree', 'item_rating', 'spd_matrix']
+# fields kept per sample in compact mode (others are gathered by `BlockCollate`)
+ID_FIELDS = ['user_seq', 'item_list']
 
 class MyDataset(Dataset):
     """
     Process & make dataset for DataLoader
+
+    Each field is one contiguous tensor (compact dtype, widened to long per sample) moved to shared memory,
+    so forked DataLoader workers index zero-copy views of the same pages instead of duplicating the dataset.
+    With `lazy=True`, only the store manifest is read at construction and samples are paged in from memory-mapped shards on access.
+    With `compact=True` (compact sample store, `data_making.py --compact_samples`), samples only hold id sequences,
+        and degrees, rating & SPD blocks are gathered per batch by `self.collate_fn` (pass it to DataLoader).
+    With `batched=True`, DataLoader fetches each batch with one `__getitems__()` call returning pre-stacked tensors
+        (use with `IndexBatchSampler` & `self.collate_fn`), instead of per-sample dicts stacked by `default_collate`.
     """
-    def __init__(self, dataset:str, split:str, seed:int, user_seq_len:int=20, item_seq_len:int=250, return_params:int=1):
+    def __init__(self, dataset:str, split:str, seed:int, user_seq_len:int=20, item_seq_len:int=250, return_params:int=1,
+                 edge_encoding:bool=False, max_edge_dist:int=5, spd_mode:str='store', spd_cutoff:int=15, memory_report_interval:int=0,
+                 lazy:bool=False, compact:bool=False, batched:bool=False):
         """
         Args:
             dataset: raw dataset name (ciao // epinions)
             split: dataset split type (train // valid // test)
             seed: random seed used in dataset split
             item_seq_len: length of item list (processed in `data_utils.py`)
+            edge_encoding: add `edge_path` (trust edge types on shortest paths within each walk, see `graph_utils.EdgePathEncoder`)
+            max_edge_dist: max number of edges encoded per path
+            spd_mode, spd_cutoff: SPD table used in edge encoding & compact mode (store // lazy)
+            memory_report_interval: print memory usage of each worker every N samples (0: no report)
+            lazy: read samples from memory-mapped store on access, instead of loading whole split
+            compact: load compact sample store (id sequences only), gather other fields per batch in `collate_fn`
+            batched: return pre-stacked batch from `__getitems__()`
         """
         self.data_path = os.path.join(os.getcwd(), 'dataset', dataset)
+        self.memory_report_interval = memory_report_interval
+        self.lazy = lazy
+        self.batched = batched
+        self._num_fetched = 0
         
-        # Load preprocessed .pkl file
-        file_path = os.path.join(
-            self.data_path, 
-            f'sequence_data_seed_{seed}_walk_{user_seq_len}_itemlen_{item_seq_len}_rp_{return_params}_{split}.pkl'
-        )
-        dataframe = pd.read_pickle(file_path)
-        print("dataset loaded")
+        # Load preprocessed sample store (legacy .pkl file is converted once)
+        self.store = load_sample_store(self.data_path, sample_data_name(seed, user_seq_len, item_seq_len, return_params, split, compact=compact))
+        missing = [name for name in (ID_FIELDS if compact else MODEL_FIELDS) if name not in self.store.fields]
+        if missing:
+            raise ValueError(f"Sample store {self.store.path} has no fields {missing} (compact={compact}), rebuild it with `data_making.py`.")
+        self.compact = compact
+        self.fields = ID_FIELDS if self.compact else MODEL_FIELDS
+
+        # {field: [num_samples, *shape] tensor}
+            # user_seq, user_degree: [seq_len_user] int32 // item_list, item_degree: [seq_len_item] int32
+            # item_rating: [seq_len_user, seq_len_item] uint8 // spd_matrix: [seq_len_user, seq_len_user] uint8
+        self.tensors = {} if lazy else {name: shared_tensor(self.store.field(name)) for name in self.fields}
+        print("dataset loaded" + (" (lazy)" if lazy else "") + (" (compact)" if self.compact else ""))
 
-        self.user_sequences = torch.tensor(dataframe['user_sequences'].tolist(), dtype=torch.long)
+        spd_table = load_spd_table(self.data_path, spd_mode, spd_cutoff) if edge_encoding or self.compact else None
+        self.edge_encoder = edge_path_encoder(self.data_path, max_edge_dist, spd_table=spd_table) if edge_encoding else None
+        # None => DataLoader's default_collate
+        if self.compact:
+            self.collate_fn = BlockCollate(self.data_path, split, seed, spd_table)
+        else:
+            self.collate_fn = collate_batch if batched else None
+
+    
+    def __len__(self):
+        return len(self.store)
 
-        self.user_degree = torch.tensor(dataframe['user_degree'].tolist(), dtype=torch.long)
+    @property
+    def nbytes(self) -> int:
+        return sum(tensor.element_size() * tensor.nelement() for tensor in self.tensors.values())
 
-        self.item_sequences = torch.tensor(dataframe['item_sequences'].tolist(), dtype=torch.long)
+    def report_memory(self):
+        """
+        Print memory usage of current process (DataLoader worker or main process).
+        Private memory should stay flat during epoch, since dataset tensors are shared.
+        """
+        worker_info = get_worker_info()
+        worker = f"worker {worker_info.id}" if worker_info is not None else "main"
+        memory = process_memory()
+        print(f"[dataset] {worker} (pid {os.getpid()}), samples: {self._num_fetched}, "
+              + ", ".join(f"{key}: {value:.1f}MB" for key, value in memory.items())
+              + f" (dataset tensors: {self.nbytes / 1024 ** 2:.1f}MB)")
 
-        self.item_degree = torch.tensor(dataframe['item_degree'].tolist(), dtype=torch.long)
+    def __getitem__(self, index):
+        if self.lazy:
+            batch_data = {name: torch.from_numpy(value).long() for name, value in self.store.sample(index, self.fields).items()}
+        else:
+            batch_data = {name: self.tensors[name][index].long() for name in self.fields}
 
-        print("start")
+        if self.edge_encoder is not None:
+            # [seq_len_user, seq_len_user, max_edge_dist]
+            batch_data['edge_path'] = torch.from_numpy(self.edge_encoder.encode(batch_data['user_seq'].numpy()).astype(np.int64))
 
-        self.rating_matrix = dataframe['item_rating']
-        
-        self.spd_matrix = dataframe['spd_matrix']
+        self._count_fetched(1)
 
-        print("end")
+        return batch_data
+
+    def __getitems__(self, indices):
+        """
+        Called by DataLoader with indices of one batch.
+        """
+        if not self.batched:
+            return [self[index] for index in indices]
+
+        return self.get_batch(indices)
+
+    def get_batch(self, indices) -> dict:
+        """
+        Pre-stacked batch, {field: [len(indices), *shape] long tensor} (one gather per field).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.lazy:
+            batch_data = {name: torch.from_numpy(self.store.rows(name, indices)).long() for name in self.fields}
+        else:
+            index = torch.from_numpy(indices)
+            batch_data = {name: self.tensors[name][index].long() for name in self.fields}
+
+        if self.edge_encoder is not None:
+            # [batch_size, seq_len_user, seq_len_user, max_edge_dist]
+            batch_data['edge_path'] = torch.from_numpy(self.edge_encoder.encode(batch_data['user_seq'].numpy()).astype(np.int64))
+
+        self._count_fetched(len(indices))
+
+        return batch_data
+
+    def lengths(self) -> tuple:
+        """
+        Effective (unpadded) user & item length of each sample, ([num_samples], [num_samples]), for `BucketBatchSampler`.
+        """
+        if self.lazy:
+            user_seq, item_list = self.store.field('user_seq'), self.store.field('item_list')
+        else:
+            user_seq, item_list = self.tensors['user_seq'].numpy(), self.tensors['item_list'].numpy()
+
+        return effective_length(user_seq), effective_length(item_list)
+
+    def _count_fetched(self, num_samples:int):
+        previous = self._num_fetched
+        self._num_fetched += num_samples
+        if self.memory_report_interval > 0 and self._num_fetched // self.memory_report_interval > previous // self.memory_report_interval:
+            self.report_memory()
+
+class IndexBatchSampler(Sampler):
+    """
+    Yield index arrays of batches (for `MyDataset.__getitems__()`), from one permutation per epoch.
+    Same order as `DataLoader(shuffle=True, generator=generator)` with same generator state.
+    """
+    def __init__(self, num_samples:int, batch_size:int, shuffle:bool=False, drop_last:bool=False, generator:torch.Generator=None):
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
 
-    
     def __len__(self):
-        return len(self.user_sequences)
+        if self.drop_last:
+            return self.num_samples // self.batch_size
 
-    def __getitem__(self, index):
+        return math.ceil(self.num_samples / self.batch_size)
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(self.num_samples, generator=self.generator).numpy()
+        else:
+            order = np.arange(self.num_samples)
+
+        for batch_index in range(len(self)):
+            yield order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size]
+
+class BucketBatchSampler(Sampler):
+    """
+    Yield index arrays of batches whose samples have similar effective user & item lengths,
+    so `TrimCollate` can cut most of the zero padding of each batch.
+
+    Samples are sorted by (user length bucket, item length bucket) in random order within bucket,
+    cut into batches, and batches are yielded in random order (every epoch).
+    """
+    def __init__(self, user_lengths:np.ndarray, item_lengths:np.ndarray, batch_size:int, shuffle:bool=False, drop_last:bool=False,
+                 user_bucket_size:int=5, item_bucket_size:int=10, generator:torch.Generator=None):
+        """
+        Args:
+            user_lengths, item_lengths: effective lengths of samples (`MyDataset.lengths()`)
+            batch_size: number of samples per batch
+            shuffle: shuffle samples within bucket & order of batches
+            drop_last: drop last incomplete batch
+            user_bucket_size, item_bucket_size: width of length buckets
+        """
+        user_bucket = (np.asarray(user_lengths) + user_bucket_size - 1) // user_bucket_size
+        item_bucket = (np.asarray(item_lengths) + item_bucket_size - 1) // item_bucket_size
+        self.keys = user_bucket * (int(item_bucket.max(initial=0)) + 1) + item_bucket
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.keys) // self.batch_size
+
+        return math.ceil(len(self.keys) / self.batch_size)
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(len(self.keys), generator=self.generator).numpy()
+        else:
+            order = np.arange(len(self.keys))
+        # stable sort => random order within bucket
+        order = order[np.argsort(self.keys[order], kind='stable')]
+
+        batch_order = torch.randperm(len(self), generator=self.generator).numpy() if self.shuffle else range(len(self))
+        for batch_index in batch_order:
+            yield order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size]
+
+class TrimCollate:
+    """
+    Collate batch (with `collate_fn`, default: `collate_batch`), then cut user & item padding beyond longest sample of batch.
+    With `user_buckets` / `item_buckets` (sorted lengths, see `shape_buckets()`), trimmed lengths are rounded up to
+    next bucket => only a few static batch shapes (no recompilation of `torch.compile`d model).
+    """
+    def __init__(self, collate_fn=None, user_buckets=None, item_buckets=None):
+        self.collate_fn = collate_fn or collate_batch
+        self.user_buckets = user_buckets
+        self.item_buckets = item_buckets
+
+    def __call__(self, samples) -> dict:
+        return trim_batch(self.collate_fn(samples), self.user_buckets, self.item_buckets)
+
+def trim_batch(batch:dict, user_buckets=None, item_buckets=None) -> dict:
+    """
+    Cut trailing zero padding of user & item axes to max effective length in batch (rounded up to bucket lengths, if given).
+        user_seq, user_degree: [batch_size, user_len] // item_list, item_degree: [batch_size, item_len]
+        item_rating: [batch_size, user_len, item_len] // spd_matrix: [batch_size, user_len, user_len]
+        edge_path: [batch_size, user_len, user_len, max_edge_dist]
+    """
+    user_len = max(int(effective_length(batch['user_seq'].numpy()).max(initial=0)), 1)
+    item_len = max(int(effective_length(batch['item_list'].numpy()).max(initial=0)), 1)
+    if user_buckets is not None:
+        user_len = bucket_length(user_len, user_buckets)
+    if item_buckets is not None:
+        item_len = bucket_length(item_len, item_buckets)
+
+    trimmed = {
+        'user_seq': batch['user_seq'][:, :user_len],
+        'user_degree': batch['user_degree'][:, :user_len],
+        'item_list': batch['item_list'][:, :item_len],
+        'item_degree': batch['item_degree'][:, :item_len],
+        'item_rating': batch['item_rating'][:, :user_len, :item_len],
+        'spd_matrix': batch['spd_matrix'][:, :user_len, :user_len],
+    }
+    if 'edge_path' in batch:
+        trimmed['edge_path'] = batch['edge_path'][:, :user_len, :user_len]
+
+    return {key: value.contiguous() for key, value in trimmed.items()}
+
+def shape_buckets(max_len:int, num_buckets:int) -> list:
+    """
+    `num_buckets` evenly spaced static lengths up to `max_len` (e.g. 100, 4 => [25, 50, 75, 100]).
+    """
+    num_buckets = max(min(num_buckets, max_len), 1)
+
+    return sorted({math.ceil(max_len * (i + 1) / num_buckets) for i in range(num_buckets)})
+
+def bucket_length(length:int, buckets:list) -> int:
+    """
+    Smallest bucket length >= length (last bucket if length exceeds all).
+    """
+    index = min(int(np.searchsorted(buckets, length)), len(buckets) - 1)
+
+    return int(buckets[index])
+
+def effective_length(ids:np.ndarray) -> np.ndarray:
+    """
+    Length of each id sequence without trailing zero padding, [..., seq_len] => [...]
+    """
+    nonzero = np.asarray(ids) != 0
+    seq_len = nonzero.shape[-1]
+
+    return np.where(nonzero.any(axis=-1), seq_len - np.argmax(nonzero[..., ::-1], axis=-1), 0)
+
+def collate_batch(samples):
+    """
+    Pre-stacked batch (from `MyDataset.__getitems__()`) is used as is, list of samples is stacked by `default_collate`.
+    """
+    if isinstance(samples, dict):
+        return samples
+
+    return default_collate(samples)
+
+def shared_tensor(array:np.ndarray) -> torch.Tensor:
+    """
+    Contiguous tensor in shared memory (one storage => no per-sample python objects, no copy in workers).
+    """
+    return torch.from_numpy(np.ascontiguousarray(array)).share_memory_()
+
+class BlockCollate:
+    """
+    Collate compact samples (id sequences only), then gather derived fields of whole batch at once from global tables:
+        user_degree, item_degree: id-indexed degree arrays of split (`degree_table_*.npy`)
+        item_rating: [batch_size, seq_len_user, seq_len_item] block of sparse rating store
+        spd_matrix: [batch_size, seq_len_user, seq_len_user] block of SPD store (memmap) or lazy SPD table
+    Resulting batch dict is same as `default_collate` of full samples.
+    """
+    def __init__(self, data_path:str, split:str, seed:int, spd_table):
+        self.user_degree = load_degree_lookup(os.path.join(data_path, f'degree_table_social_{split}_seed_{seed}.csv'))
+        self.item_degree = load_degree_lookup(os.path.join(data_path, f'degree_table_item_{split}_seed_{seed}.csv'))
+        self.rating_store = load_rating_store(data_path)
+        self.spd_table = spd_table
+
+    def gather(self, user_seq:np.ndarray, item_list:np.ndarray) -> dict:
+        """
+        Args:
+            user_seq: [batch_size, seq_len_user] user ids
+            item_list: [batch_size, seq_len_item] item ids
+        """
         return {
-            'user_seq': self.user_sequences[index],
-            'user_degree': self.user_degree[index],
-            'item_list': self.item_sequences[index],
-            'item_degree': self.item_degree[index],
-            'item_rating': self.rating_matrix[index],
-            'spd_matrix': self.spd_matrix[index]
+            'user_degree': torch.from_numpy(lookup_degree(self.user_degree, user_seq)),
+            'item_degree': torch.from_numpy(lookup_degree(self.item_degree, item_list)),
+            'item_rating': torch.from_numpy(self.rating_store.lookup(user_seq[:, :, None], item_list[:, None, :]).astype(np.int64)),
+            'spd_matrix': torch.from_numpy(self.spd_table.gather(user_seq).astype(np.int64)),
         }
+
+    def __call__(self, samples) -> dict:
+        batch = collate_batch(samples)
+        batch.update(self.gather(batch['user_seq'].numpy(), batch['item_list'].numpy()))
+
+        return batch
+
+def lookup_degree(degree:np.ndarray, ids:np.ndarray) -> np.ndarray:
+    """
+    Degree of ids (0 for ids out of degree array).
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+
+    return np.where(ids < len(degree), degree[np.minimum(ids, len(degree) - 1)], 0).astype(np.int64)
+
+def load_spd_table(data_path:str, spd_mode:str='store', spd_cutoff:int=15):
+    """
+    SPD store (memmap) in store mode, or lazy BFS table of entire trust network in lazy mode.
+    """
+    if spd_mode == 'lazy':
+        return LazySPDTable(CSRGraph.from_csv(os.path.join(data_path, 'trustnetwork.csv')), cutoff=spd_cutoff)
+
+    return load_spd_store(data_path)
+
+def edge_path_encoder(data_path:str, max_edge_dist:int=5, spd_mode:str='store', spd_cutoff:int=15, spd_table=None) -> EdgePathEncoder:
+    """
+    Edge path encoder over entire trust network (same graph as SPD matrix).
+    """
+    if spd_table is None:
+        spd_table = load_spd_table(data_path, spd_mode, spd_cutoff)
+
+    return EdgePathEncoder.from_csv(os.path.join(data_path, 'trustnetwork.csv'), spd_table, max_dist=max_edge_dist)
     
+class OnlineWalkDataset(Dataset):
+    """
+    Build samples on the fly (inside DataLoader workers), instead of loading preprocessed sample store.
+    Only graph, interaction, rating & SPD indexes are kept, and every `__getitem__` generates
+        a new random walk from anchor user => item window (one random slice of interacted items) => rating & SPD block.
+    So each epoch sees different walks & item windows, without offline `generate_input_sequence_data()`.
+
+    Requires tables made by `data_making.py` up to random walk stage:
+        trustnetwork_{split}_seed_{seed}.csv, degree_table_social_{split}_seed_{seed}.csv,
+        user_item_interaction_{split}_seed_{seed}.csv, rating_matrix.npz (& shortest_path_result.spd in store mode)
+    """
+    def __init__(self, dataset:str, split:str, seed:int, user_seq_len:int=20, item_seq_len:int=250, return_params:int=1,
+                 repeats:int=None, spd_mode:str='store', spd_cutoff:int=15, spd_cache_size:int=4096, item_order:str='set',
+                 edge_encoding:bool=False, max_edge_dist:int=5):
+        """
+        Args:
+            dataset: raw dataset name (ciao // epinions)
+            split: dataset split type (train // valid // test)
+            seed: random seed used in dataset split
+            user_seq_len: random walk length
+            item_seq_len: length of item list
+            return_params: probability (x10) of returning to previous node
+            repeats: number of samples per anchor user in one epoch (default: 10 for train, 1 otherwise, same as offline walks)
+            spd_mode: store // lazy (see `data_utils.generate_input_sequence_data()`)
+            spd_cutoff: max SPD value computed in lazy mode
+            spd_cache_size: number of source users cached in lazy mode (per worker)
+            item_order: order of de-duplicated item list (see `UserItemIndex.walk_items()`)
+            edge_encoding: add `edge_path` (see `MyDataset`)
+            max_edge_dist: max number of edges encoded per path
+        """
+        self.data_path = os.path.join(os.getcwd(), 'dataset', dataset)
+        self.seed = seed
+        self.user_seq_len = user_seq_len
+        self.item_seq_len = item_seq_len
+        self.return_params = return_params / 10
+        self.item_order = item_order
+
+        self.graph = CSRGraph.from_csv(os.path.join(self.data_path, f'trustnetwork_{split}_seed_{seed}.csv'))
+        self.anchors = self.graph.nodes()
+        self.repeats = repeats if repeats is not None else (10 if split == 'train' else 1)
+
+        # id-indexed user degree (0 for zero-padded node)
+        self.user_degree = load_degree_lookup(os.path.join(self.data_path, f'degree_table_social_{split}_seed_{seed}.csv'))
+
+        self.item_index = UserItemIndex.from_interaction_table(os.path.join(self.data_path, f'user_item_interaction_{split}_seed_{seed}.csv'))
+        self.rating_store = load_rating_store(self.data_path)
+        if spd_mode == 'lazy':
+            self.spd_table = LazySPDTable(CSRGraph.from_csv(os.path.join(self.data_path, 'trustnetwork.csv')), cutoff=spd_cutoff, cache_size=spd_cache_size)
+        else:
+            self.spd_table = load_spd_store(self.data_path)
+        # edge encoding shares SPD table (& its cache) with `spd_matrix`
+        self.edge_encoder = edge_path_encoder(self.data_path, max_edge_dist, spd_table=self.spd_table) if edge_encoding else None
+
+        self._rng = None
+        self._rng_pid = None
+
+    def __len__(self):
+        return len(self.anchors) * self.repeats
+
+    def rng(self) -> np.random.Generator:
+        """
+        RNG of current process, seeded with torch's per-worker seed
+        (DataLoader draws new base seed every epoch => different walks every epoch, reproducible with `torch.manual_seed()`).
+        """
+        if self._rng is None or self._rng_pid != os.getpid():
+            worker_info = get_worker_info()
+            worker_seed = worker_info.seed if worker_info is not None else torch.initial_seed()
+            self._rng = np.random.default_rng([self.seed, worker_seed])
+            self._rng_pid = os.getpid()
+
+        return self._rng
+
+    def __getitem__(self, index):
+        rng = self.rng()
+        anchor = self.anchors[index % len(self.anchors)]
+
+        # [seq_len_user], 0-padded after dead end
+        user_seq = random_walk(self.graph, [anchor], self.user_seq_len, return_params=self.return_params, rng=rng)[0]
+
+        # item window: one of the item_seq_len slices of interacted items (offline data uses all slices as samples)
+        item_list = self.item_index.walk_items(user_seq, item_order=self.item_order)
+        num_slices = math.ceil(len(item_list) / self.item_seq_len)
+        slice_index = rng.integers(num_slices) if num_slices > 0 else 0
+        item_window = np.zeros(self.item_seq_len, dtype=np.int64)
+        window = item_list[slice_index * self.item_seq_len:(slice_index + 1) * self.item_seq_len]
+        item_window[:len(window)] = window
+
+        batch_data = {
+            'user_seq': torch.from_numpy(user_seq),
+            'user_degree': torch.from_numpy(self.user_degree[user_seq]),
+            'item_list': torch.from_numpy(item_window),
+            'item_degree': torch.from_numpy(self.item_index.item_degree[item_window]),
+            'item_rating': torch.from_numpy(self.rating_store.lookup(user_seq[:, None], item_window[None, :]).astype(np.int64)),
+            'spd_matrix': torch.from_numpy(self.spd_table.gather(user_seq).astype(np.int64))
+        }
+        if self.edge_encoder is not None:
+            batch_data['edge_path'] = torch.from_numpy(self.edge_encoder.encode(user_seq).astype(np.int64))
+
+        return batch_data
+
 if __name__ == "__main__":
     dataset = 'ciao'
     split = 'train'
@@ -0,0 +1,621 @@
+"""
+Graph utilities for preprocessing, based on CSR adjacency (indptr / indices arrays).
+
+    - CSRGraph: undirected social graph, indexed directly by user id (id 0 is reserved for zero-padding)
+    - node_degree() / distinct_degree(): id-indexed degree arrays with np.bincount (social graph / user-item graph)
+    - UserItemIndex: user -> interacted items CSR index & item degree array (user-item graph)
+    - random_walk(): advance every random walk of a batch at once with NumPy
+    - sharded_random_walk(): split anchors into fixed-size shards & run them on a process pool
+    - bfs_shortest_path_distance(): multi-source BFS truncated at `cutoff` hops
+    - all_pairs_shortest_path_distance(): BFS based SPD matrix (replaces O(n^3) Floyd-Warshall for unweighted graph)
+    - LazySPDTable: SPD computed on demand only from nodes in walks, cached per source node (LRU)
+    - EdgePathEncoder: trust direction of each hop on shortest paths between users of a walk (edge encoding input)
+"""
+import json
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# number of anchors per walk shard. (fixed, so that the output does not depend on the number of workers)
+WALK_SHARD_SIZE = 4096
+
+# SPD value for unreachable node pairs (& pairs farther than cutoff), fits in uint8.
+UNREACHABLE_SPD = 255
+
+def node_degree(src, dst) -> np.ndarray:
+    """
+    Id-indexed degree array of undirected graph given as edge arrays, same as `nx.Graph.degree()`:
+    duplicated & reversed edges are counted once, self-loop adds 2.
+
+    Returns:
+        [max id + 1] int64 array (0 for ids not in graph)
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    num_ids = int(max(src.max(), dst.max())) + 1 if len(src) else 1
+
+    low, high = np.minimum(src, dst), np.maximum(src, dst)
+    edge_key = np.unique(low * num_ids + high)
+    low, high = np.divmod(edge_key, num_ids)
+
+    return np.bincount(low, minlength=num_ids) + np.bincount(high, minlength=num_ids)
+
+def distinct_degree(keys, values) -> np.ndarray:
+    """
+    Id-indexed number of distinct `values` per key, e.g. item degree (number of users who rated each item)
+    with `distinct_degree(items, users)`, same as `groupby(key)[value].nunique()`.
+
+    Returns:
+        [max key + 1] int64 array (0 for keys not appearing)
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    if len(keys) == 0:
+        return np.zeros(1, dtype=np.int64)
+
+    num_values = int(values.max()) + 1
+    pair_key = np.unique(keys * num_values + values)
+
+    return np.bincount(pair_key // num_values, minlength=int(keys.max()) + 1)
+
+class CSRGraph:
+    """
+    Undirected graph stored as CSR adjacency.
+        neighbors of node `u` are `indices[indptr[u]:indptr[u + 1]]` (sorted).
+        node ids are used as row index as it is, so row 0 (padding id) has no neighbors.
+    """
+    def __init__(self, indptr:np.ndarray, indices:np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.num_nodes = len(indptr) - 2     # max node id
+        self.degree = np.diff(indptr)
+
+    @classmethod
+    def from_edge_list(cls, src, dst, num_nodes:int=None):
+        """
+        Build graph from (src, dst) edge arrays.
+        Edges are symmetrized & de-duplicated, same as `nx.from_pandas_edgelist()` does for `nx.Graph`.
+
+        Args:
+            src, dst: node id arrays of each edge
+            num_nodes: max node id (default: max id in edge list)
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if num_nodes is None:
+            num_nodes = int(max(src.max(), dst.max())) if len(src) else 0
+
+        row = np.concatenate([src, dst])
+        col = np.concatenate([dst, src])
+        edge_key = np.unique(row * (num_nodes + 1) + col)
+        row, col = np.divmod(edge_key, num_nodes + 1)
+
+        indptr = np.zeros(num_nodes + 2, dtype=np.int64)
+        np.cumsum(np.bincount(row, minlength=num_nodes + 1), out=indptr[1:])
+
+        return cls(indptr, col.astype(np.int32))
+
+    @classmethod
+    def from_csv(cls, trust_file:str, num_nodes:int=None):
+        """
+        Build graph from trustnetwork .csv file (`user_id_1`, `user_id_2` columns).
+        """
+        dataframe = pd.read_csv(trust_file, usecols=['user_id_1', 'user_id_2'])
+
+        return cls.from_edge_list(dataframe['user_id_1'].values, dataframe['user_id_2'].values, num_nodes=num_nodes)
+
+    def nodes(self) -> np.ndarray:
+        """
+        Node ids that have at least one edge (= nodes of the networkx graph built from the same edge list).
+        """
+        return np.flatnonzero(self.degree)
+
+    def neighbors(self, node:int) -> np.ndarray:
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+
+def csr_gather(indptr:np.ndarray, data:np.ndarray, rows:np.ndarray):
+    """
+    Concatenate CSR slices `data[indptr[row]:indptr[row + 1]]` of all rows, without python loop.
+
+    Returns:
+        values: concatenated slices
+        counts: length of each row's slice
+    """
+    counts = indptr[rows + 1] - indptr[rows]
+    ends = np.cumsum(counts)
+    offsets = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+
+    return data[np.repeat(indptr[rows], counts) + offsets], counts
+
+
+class UserItemIndex:
+    """
+    Interacted items of each user as CSR (items of user `u` are `items[indptr[u]:indptr[u + 1]]`),
+    and degree of each item (number of interacted users) as id-indexed array.
+    Item order of each user is kept as in `user_item_interaction_{split}_seed_{seed}.csv`.
+    """
+    def __init__(self, indptr:np.ndarray, items:np.ndarray, item_degree:np.ndarray):
+        self.indptr = indptr
+        self.items = items
+        self.item_degree = item_degree
+
+    @classmethod
+    def from_interaction_table(cls, item_file:str):
+        """
+        Build index from `generate_interacted_items_table()` result.
+        (row of user 0, which is for zero-padding, is skipped)
+        """
+        dataframe = pd.read_csv(item_file, usecols=['user_id', 'product_id', 'product_degree'])
+        dataframe = dataframe[dataframe['user_id'] != 0]
+
+        users = dataframe['user_id'].values.astype(np.int64)
+        item_lists = [json.loads(x) for x in dataframe['product_id']]
+        degree_lists = [json.loads(x) for x in dataframe['product_degree']]
+        counts = np.array([len(x) for x in item_lists], dtype=np.int64)
+
+        num_users = int(users.max()) if len(users) else 0
+        user_counts = np.zeros(num_users + 1, dtype=np.int64)
+        user_counts[users] = counts
+        indptr = np.zeros(num_users + 2, dtype=np.int64)
+        np.cumsum(user_counts, out=indptr[1:])
+
+        # place each user's item list at its CSR slot
+        order = np.argsort(users, kind='stable')
+        items = np.fromiter((item for i in order for item in item_lists[i]), dtype=np.int64, count=counts.sum())
+        degrees = np.fromiter((degree for i in order for degree in degree_lists[i]), dtype=np.int64, count=counts.sum())
+
+        item_degree = np.zeros(int(items.max()) + 1 if len(items) else 1, dtype=np.int64)
+        item_degree[items] = degrees
+
+        return cls(indptr, items, item_degree)
+
+    @property
+    def num_users(self) -> int:
+        return len(self.indptr) - 2
+
+    def walk_items(self, walk:np.ndarray, item_order:str='set') -> np.ndarray:
+        """
+        De-duplicated items interacted by users of a random walk. (zero-padded users & unknown users are skipped)
+
+        Args:
+            walk: user ids of random walk, [walk_len]
+            item_order: order of de-duplicated items
+                set: iteration order of `set(item_list)`, same as previous preprocessing
+                first: order of first appearance (independent of python's set implementation)
+        """
+        users = walk[(walk > 0) & (walk <= self.num_users)]
+        items, _ = csr_gather(self.indptr, self.items, users)
+
+        if item_order == 'set':
+            return np.array(list(set(items.tolist())), dtype=np.int64)
+        elif item_order == 'first':
+            _, first_index = np.unique(items, return_index=True)
+            return items[np.sort(first_index)]
+        raise ValueError(f"Unknown item order: {item_order}")
+
+
+def random_walk(graph:CSRGraph, anchors, walk_length:int, return_params:float=0.0, rng=None, max_retries:int=10) -> np.ndarray:
+    """
+    Generate one random walk per anchor node, advancing all walks of the batch at once.
+
+    Follows the previous `find_next_node()` semantics:
+        - 1st step moves to one of the neighbors uniformly.
+        - next steps go back to the previous node with probability `return_params`,
+          otherwise move to one of the other neighbors uniformly.
+          (if previous node is the only neighbor, it is a dead end)
+        - selected node already in the walk is rejected & re-sampled.
+          rejection count is accumulated per walk, and over `max_retries` rejections the walk stops.
+        - stopped walks (dead end, too many rejections) are zero-padded up to `walk_length`.
+
+    Args:
+        graph: social graph (CSRGraph)
+        anchors: start node of each walk, [num_walks]
+        walk_length: length of random walk (including anchor)
+        return_params: probability of returning to previous node
+        rng: np.random.Generator or seed (default=None)
+        max_retries: threshold of rejected re-visits (default=10)
+
+    Returns:
+        walks: [num_walks, walk_length] int64 array (walks[:, 0] == anchors)
+    """
+    rng = np.random.default_rng(rng)
+    anchors = np.asarray(anchors, dtype=np.int64)
+    num_walks = len(anchors)
+
+    walks = np.zeros((num_walks, walk_length), dtype=np.int64)
+    if num_walks == 0 or walk_length == 0:
+        return walks
+    walks[:, 0] = anchors
+    if walk_length == 1:
+        return walks
+
+    indptr, indices, degree = graph.indptr, graph.indices, graph.degree
+
+    # 1st step: no previous node, move to one of the neighbors uniformly.
+    num_neighbors = degree[anchors]
+    has_neighbor = num_neighbors > 0
+    offset = rng.integers(0, np.maximum(num_neighbors, 1))
+    walks[has_neighbor, 1] = indices[indptr[anchors[has_neighbor]] + offset[has_neighbor]]
+
+    # walk position to fill next & number of rejected re-visits
+    position = np.full(num_walks, 2, dtype=np.int64)
+    retries = np.zeros(num_walks, dtype=np.int64)
+    active = np.flatnonzero(walks[:, 1] != 0) if walk_length > 2 else np.empty(0, dtype=np.int64)
+
+    while len(active) > 0:
+        current = walks[active, position[active] - 1]
+        previous = walks[active, position[active] - 2]
+
+        # neighbors except the previous node
+        num_others = degree[current] - 1
+        start = indptr[current]
+
+        # select one of the other neighbors uniformly:
+        #   draw from first (num_others) slots, and if previous node is drawn, take the last slot instead.
+        offset = rng.integers(0, np.maximum(num_others, 1))
+        next_node = indices[start + offset].astype(np.int64)
+        next_node = np.where(next_node == previous, indices[start + np.maximum(num_others, 0)], next_node)
+
+        # go back to the previous node by RETURN_PARAMS
+        go_back = rng.random(len(active)) < return_params
+        next_node = np.where(go_back, previous, next_node)
+
+        # dead end
+        next_node = np.where(num_others > 0, next_node, 0)
+
+        # reject re-visit
+        rejected = (next_node != 0) & (walks[active] == next_node[:, None]).any(axis=1)
+        retries[active[rejected]] += 1
+        give_up = rejected & (retries[active] > max_retries)
+
+        accepted = ~rejected
+        accepted_walks = active[accepted]
+        walks[accepted_walks, position[accepted_walks]] = next_node[accepted]
+        position[accepted_walks] += 1
+
+        # walks are zero-initialized, so stopped walks are already zero-padded.
+        finished = give_up | (accepted & (next_node == 0)) | (position[active] >= walk_length)
+        active = active[~finished]
+
+    return walks
+
+
+# graph shared by pool workers (set by pool initializer, inherited copy-on-write when forked)
+_worker_graph = None
+
+def _init_graph_worker(graph:CSRGraph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _graph_pool(graph:CSRGraph, num_workers:int):
+    """
+    Process pool whose workers hold the graph as `_worker_graph`.
+    Forked workers share the parent's graph arrays without copying.
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in start_methods else None)
+
+    return context.Pool(num_workers, initializer=_init_graph_worker, initargs=(graph,))
+
+def _walk_shard(task):
+    shard_id, anchors, walk_length, return_params, seed = task
+    rng = np.random.default_rng([seed, shard_id])
+
+    return random_walk(_worker_graph, anchors, walk_length=walk_length, return_params=return_params, rng=rng)
+
+def sharded_random_walk(graph:CSRGraph, anchors, walk_length:int, return_params:float=0.0, seed:int=42, num_workers:int=1, shard_size:int=WALK_SHARD_SIZE) -> np.ndarray:
+    """
+    Run `random_walk()` over shards of anchors on a process pool.
+    Each shard draws from its own RNG stream derived from (seed, shard_id), and shards are merged in order,
+    so the result is identical whatever the number of workers.
+
+    Args:
+        graph: social graph (CSRGraph), shared read-only by all workers
+        anchors: start node of each walk, [num_walks]
+        walk_length: length of random walk (including anchor)
+        return_params: probability of returning to previous node
+        seed: random seed (data split seed)
+        num_workers: number of worker processes (default=1, run in current process)
+        shard_size: number of anchors per shard
+
+    Returns:
+        walks: [num_walks, walk_length] int64 array
+    """
+    anchors = np.asarray(anchors, dtype=np.int64)
+    tasks = [
+        (shard_id, anchors[start:start + shard_size], walk_length, return_params, seed)
+        for shard_id, start in enumerate(range(0, len(anchors), shard_size))
+    ]
+    if len(tasks) == 0:
+        return np.zeros((0, walk_length), dtype=np.int64)
+
+    num_workers = min(num_workers, len(tasks))
+    if num_workers <= 1:
+        _init_graph_worker(graph)
+        results = [_walk_shard(task) for task in tasks]
+    else:
+        with _graph_pool(graph, num_workers) as pool:
+            results = pool.map(_walk_shard, tasks)
+
+    return np.concatenate(results)
+
+
+def bfs_shortest_path_distance(graph:CSRGraph, sources, cutoff:int, unreachable:int=UNREACHABLE_SPD) -> np.ndarray:
+    """
+    Level-synchronous BFS from every source at once. (graph is unweighted, so BFS level == shortest path distance)
+    Search stops at `cutoff` hops, and farther/unreachable nodes get `unreachable` value.
+
+    Args:
+        graph: social graph (CSRGraph)
+        sources: source node ids, [num_sources]
+        cutoff: max distance to search (e.g. `max_spd_value`)
+        unreachable: value for unreachable nodes (cutoff < unreachable <= 255)
+
+    Returns:
+        dist: [num_sources, num_nodes] uint8 array, dist[i][id - 1] is distance from sources[i] to node `id`
+              (same indexing as Floyd-Warshall result)
+    """
+    assert cutoff < unreachable <= 255, "SPD values are stored as uint8"
+    indptr, indices, degree = graph.indptr, graph.indices, graph.degree
+    num_rows = graph.num_nodes + 1
+
+    sources = np.asarray(sources, dtype=np.int64)
+    dist = np.full((len(sources), num_rows), unreachable, dtype=np.uint8)
+    dist_flat = dist.reshape(-1)
+
+    # frontier: (row of source, node) pairs reached at the last level
+    rows = np.arange(len(sources), dtype=np.int64)
+    frontier = sources
+    dist[rows, frontier] = 0
+
+    for level in range(1, cutoff + 1):
+        if degree[frontier].sum() == 0:
+            break
+
+        # gather all neighbors of frontier nodes (concatenated CSR slices)
+        neighbors, counts = csr_gather(indptr, indices, frontier)
+
+        # keep not visited (row, node) pairs only
+        flat_index = np.repeat(rows, counts) * num_rows + neighbors
+        flat_index = np.unique(flat_index[dist_flat[flat_index] == unreachable])
+        dist_flat[flat_index] = level
+
+        rows, frontier = np.divmod(flat_index, num_rows)
+
+    # drop padding id column (id 0)
+    return dist[:, 1:]
+
+def _bfs_batch(task):
+    sources, cutoff, unreachable = task
+
+    return bfs_shortest_path_distance(_worker_graph, sources, cutoff=cutoff, unreachable=unreachable)
+
+def all_pairs_shortest_path_distance(graph:CSRGraph, cutoff:int, unreachable:int=UNREACHABLE_SPD, num_workers:int=1, batch_size:int=256, out:np.ndarray=None) -> np.ndarray:
+    """
+    All-pairs shortest path distance with BFS from every node, parallelized over batches of source nodes.
+
+    Args:
+        graph: social graph (CSRGraph), node ids are 1 ~ num_nodes
+        cutoff: max distance to search (e.g. `max_spd_value`)
+        unreachable: value for unreachable nodes & nodes farther than cutoff
+        num_workers: number of worker processes (default=1, run in current process)
+        batch_size: number of sources per BFS batch
+        out: [num_nodes, num_nodes] uint8 array to write result into (e.g. np.memmap) (default: new array)
+
+    Returns:
+        [num_nodes, num_nodes] uint8 SPD matrix, indexed by (id - 1)
+    """
+    num_nodes = graph.num_nodes
+    if out is None:
+        out = np.empty((num_nodes, num_nodes), dtype=np.uint8)
+
+    tasks = [
+        (np.arange(start, min(start + batch_size, num_nodes)) + 1, cutoff, unreachable)
+        for start in range(0, num_nodes, batch_size)
+    ]
+
+    num_workers = min(num_workers, len(tasks))
+    if num_workers <= 1:
+        _init_graph_worker(graph)
+        results = map(_bfs_batch, tasks)
+        for (sources, _, _), dist in zip(tasks, results):
+            out[sources[0] - 1:sources[-1]] = dist
+    else:
+        with _graph_pool(graph, num_workers) as pool:
+            for (sources, _, _), dist in zip(tasks, pool.imap(_bfs_batch, tasks)):
+                out[sources[0] - 1:sources[-1]] = dist
+
+    return out
+
+
+class LazySPDTable:
+    """
+    SPD table computed on demand, for graphs too large to keep full [n, n] SPD matrix.
+    Bounded-depth BFS is run only from nodes appearing in walks, and each source's distance row
+    is kept in a size-capped LRU cache. Memory is `cache_size * num_nodes` bytes at most.
+
+    `gather()` returns the same result as `SPDStore.gather()` of BFS based SPD store.
+    """
+    def __init__(self, graph:CSRGraph, cutoff:int, unreachable:int=UNREACHABLE_SPD, cache_size:int=4096):
+        """
+        Args:
+            graph: social graph (CSRGraph), node ids are 1 ~ num_nodes
+            cutoff: max distance to search (e.g. `max_spd_value`)
+            unreachable: value for unreachable nodes & nodes farther than cutoff
+            cache_size: max number of cached source rows
+        """
+        self.graph = graph
+        self.cutoff = cutoff
+        self.unreachable = unreachable
+        self.cache_size = cache_size
+        self.num_nodes = graph.num_nodes
+
+        # source id -> [num_nodes] uint8 distance row
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def rows(self, sources:np.ndarray) -> np.ndarray:
+        """
+        Distance rows of (unique) source ids, [len(sources), num_nodes].
+        Missing rows are computed with one batched BFS.
+        """
+        missing = [source for source in sources.tolist() if source not in self.cache]
+        self.misses += len(missing)
+        self.hits += len(sources) - len(missing)
+
+        computed = {}
+        if missing:
+            dist = bfs_shortest_path_distance(self.graph, missing, cutoff=self.cutoff, unreachable=self.unreachable)
+            computed = dict(zip(missing, dist))
+
+        result = np.empty((len(sources), self.num_nodes), dtype=np.uint8)
+        for i, source in enumerate(sources.tolist()):
+            if source in computed:
+                result[i] = computed[source]
+                self.cache[source] = computed[source]
+            else:
+                result[i] = self.cache[source]
+                self.cache.move_to_end(source)
+
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return result
+
+    def gather(self, walk_ids) -> np.ndarray:
+        """
+        Slice [walk_len, walk_len] SPD matrices of random walk sequences at once.
+        Zero-padded id reads the last node's distances, same as `SPDStore.gather()`.
+
+        Args:
+            walk_ids: user ids of random walks, [..., walk_len]
+
+        Returns:
+            [..., walk_len, walk_len] uint8 array
+        """
+        walk_ids = np.asarray(walk_ids, dtype=np.int64)
+        walk_ids = np.where(walk_ids == 0, self.num_nodes, walk_ids)
+
+        sources = np.unique(walk_ids)
+        rows = self.rows(sources)
+        row_index = np.searchsorted(sources, walk_ids)
+
+        return rows[row_index[..., :, None], walk_ids[..., None, :] - 1]
+
+
+# trust direction of each hop on a path (edge feature of edge encoding), 0 is padding.
+EDGE_FORWARD = 1        # path goes along trust (u trusts v)
+EDGE_BACKWARD = 2       # path goes against trust (v trusts u)
+EDGE_MUTUAL = 3         # both
+NUM_EDGE_TYPES = 4
+
+class EdgePathEncoder:
+    """
+    Edge features along shortest paths between users of each random walk (input of Graphormer-style edge encoding).
+
+    Only pairs within a walk are encoded (instead of all [n, n] pairs of `algos.gen_edge_input()`),
+    and each path is traced back from target to source iteratively:
+        predecessor of node at distance r is a neighbor at distance r - 1 from source (first one in CSR order),
+    using SPD rows of `spd_table` (SPDStore or LazySPDTable) as the parent information.
+    """
+    def __init__(self, graph:CSRGraph, trust_src, trust_dst, spd_table, max_dist:int=5):
+        """
+        Args:
+            graph: undirected social graph (CSRGraph), same graph as `spd_table`
+            trust_src, trust_dst: directed trust edges (user_id_1 trusts user_id_2)
+            spd_table: provides `rows(sources)`, [len(sources), num_nodes] distance rows indexed by (id - 1)
+            max_dist: number of hops encoded per path (longer paths keep first `max_dist` hops)
+        """
+        self.graph = graph
+        self.spd_table = spd_table
+        self.max_dist = max_dist
+
+        # sorted directed (src, dst) keys => edge direction lookup with binary search
+        self.num_ids = graph.num_nodes + 1
+        trust_src = np.asarray(trust_src, dtype=np.int64)
+        trust_dst = np.asarray(trust_dst, dtype=np.int64)
+        self.trust_keys = np.unique(trust_src * self.num_ids + trust_dst)
+
+    @classmethod
+    def from_csv(cls, trust_file:str, spd_table, max_dist:int=5):
+        dataframe = pd.read_csv(trust_file, usecols=['user_id_1', 'user_id_2'])
+        src, dst = dataframe['user_id_1'].values, dataframe['user_id_2'].values
+
+        return cls(CSRGraph.from_edge_list(src, dst), src, dst, spd_table, max_dist=max_dist)
+
+    def _has_trust(self, src:np.ndarray, dst:np.ndarray) -> np.ndarray:
+        keys = src * self.num_ids + dst
+        if len(self.trust_keys) == 0:
+            return np.zeros(keys.shape, dtype=bool)
+        position = np.minimum(np.searchsorted(self.trust_keys, keys), len(self.trust_keys) - 1)
+
+        return self.trust_keys[position] == keys
+
+    def edge_type(self, src:np.ndarray, dst:np.ndarray) -> np.ndarray:
+        """
+        Trust direction of hops `src -> dst` (EDGE_FORWARD // EDGE_BACKWARD // EDGE_MUTUAL).
+        """
+        return (self._has_trust(src, dst) * EDGE_FORWARD + self._has_trust(dst, src) * EDGE_BACKWARD).astype(np.uint8)
+
+    def encode(self, walk_ids, out:np.ndarray=None) -> np.ndarray:
+        """
+        Args:
+            walk_ids: user ids of random walks, [..., walk_len]
+            out: preallocated [..., walk_len, walk_len, max_dist] uint8 buffer (optional)
+
+        Returns:
+            [..., walk_len, walk_len, max_dist] uint8 array, edge type of k-th hop on path from walk[i] to walk[j].
+            0 for padding (zero-padded users, same user, unreachable or farther than SPD cutoff).
+        """
+        walk_ids = np.asarray(walk_ids, dtype=np.int64)
+        walk_len = walk_ids.shape[-1]
+        walks = walk_ids.reshape(-1, walk_len)
+
+        if out is None:
+            out = np.zeros((*walk_ids.shape, walk_len, self.max_dist), dtype=np.uint8)
+        else:
+            out[...] = 0
+        flat_out = out.reshape(-1, self.max_dist)
+
+        sources = np.unique(walks[walks > 0])
+        if len(sources) == 0:
+            return out
+        rows = np.asarray(self.spd_table.rows(sources))
+        unreachable = getattr(self.spd_table, 'unreachable', UNREACHABLE_SPD)
+
+        # all (walk, i, j) pairs of valid users => (source row, target id, distance)
+        walk_index, i, j = np.meshgrid(np.arange(len(walks)), np.arange(walk_len), np.arange(walk_len), indexing='ij')
+        source, target = walks[walk_index, i].ravel(), walks[walk_index, j].ravel()
+        pair_index = np.flatnonzero((source > 0) & (target > 0) & (source != target))
+        source_row = np.searchsorted(sources, source[pair_index])
+        current = target[pair_index]
+        remain = rows[source_row, current - 1].astype(np.int64)
+
+        valid = remain < unreachable
+        pair_index, source_row, current, remain = pair_index[valid], source_row[valid], current[valid], remain[valid]
+
+        # trace back all paths at once, 1 hop per iteration
+        while len(pair_index) > 0:
+            neighbors, counts = csr_gather(self.graph.indptr, self.graph.indices.astype(np.int64), current)
+            segment = np.repeat(np.arange(len(current)), counts)
+            is_parent = rows[source_row[segment], neighbors - 1] == remain[segment] - 1
+
+            # first parent of each path
+            found_segment, first = np.unique(segment[is_parent], return_index=True)
+            parent = neighbors[np.flatnonzero(is_parent)[first]]
+            pair_index, source_row, current, remain = pair_index[found_segment], source_row[found_segment], current[found_segment], remain[found_segment]
+
+            # hop (parent -> current) is (remain - 1)-th hop from source
+            hop = remain - 1
+            keep = hop < self.max_dist
+            flat_out[pair_index[keep], hop[keep]] = self.edge_type(parent[keep], current[keep])
+
+            current, remain = parent, remain - 1
+            active = remain > 0
+            pair_index, source_row, current, remain = pair_index[active], source_row[active], current[active], remain[active]
+
+        return out
@@ -15,9 +15,9 @@ from torch import nn
 from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 
-from utils import redirect_stdout
+from utils import DeviceTimer, ShapeTimer, autocast_context, batch_to_device, compile_model, device_memory, get_device, redirect_stdout, setup_cpu_threads
 from config import Config
-from dataset import MyDataset
+from dataset import BucketBatchSampler, IndexBatchSampler, MyDataset, OnlineWalkDataset, TrimCollate, shape_buckets
 from models.transformer import Transformer
 from scheduler import WarmupCosineSchedule
 import requests
@@ -51,7 +51,16 @@ class AverageMeter(object):
 
 #     return loss
 
-def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, best_dev_mae, init_t, update_cnt):
+def masked_mse_loss(target, prediction):
+    """
+    MSE of known ratings only (target != 0), always computed in fp32 (prediction may be bf16 under autocast).
+    """
+    mask = (target != 0)
+    squared_diff = (prediction.float() - target.float())**2 * mask
+
+    return torch.sum(squared_diff) / torch.sum(mask)
+
+def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, best_dev_mae, init_t, update_cnt, device, precision='fp32'):
     # val_rmse = []
     # val_mae = []
     criterion = nn.MSELoss()
@@ -66,14 +75,10 @@ def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, be
                               leave=False)
         pred, trg, msk = [], [], []
         for step, batch in enumerate(epoch_iterator):
-            batch['user_seq'] = batch['user_seq'].cuda()
-            batch['user_degree'] = batch['user_degree'].cuda()
-            batch['item_list'] = batch['item_list'].cuda()
-            batch['item_degree'] = batch['item_degree'].cuda()
-            batch['item_rating'] = batch['item_rating'].cuda()
-            batch['spd_matrix'] = batch['spd_matrix'].cuda()
+            batch = batch_to_device(batch, device)
 
-            outputs, enc_loss, dec_loss = model(batch)
+            with autocast_context(device, precision):
+                outputs, enc_loss, dec_loss = model(batch)
 
             # loss = criterion(outputs.float(), batch['item_rating'].float())
             # FIXME:
@@ -91,8 +96,7 @@ def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, be
             #print(outputs.shape)
             
             mask = (batch['item_rating'] != 0)
-            squared_diff = (outputs - batch['item_rating'])**2 * mask
-            loss = torch.sum(squared_diff) / torch.sum(mask)
+            loss = masked_mse_loss(batch['item_rating'], outputs)
             #loss = criterion(outputs[mask].float(),batch['item_rating'][mask].float()).cuda()
 
             loss += enc_loss
@@ -111,9 +115,10 @@ def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, be
             # val_rmse.append(rmse)
             # val_mae.append(mae)
             
-            pred.append(outputs)
-            trg.append(batch['item_rating'])
-            msk.append(mask)
+            # flatten => batches of different (trimmed) item lengths can be concatenated
+            pred.append(outputs.reshape(-1))
+            trg.append(batch['item_rating'].reshape(-1))
+            msk.append(mask.reshape(-1))
 
             epoch_iterator.set_description(
                         "Validating (%d / %d Steps) (loss=%2.5f)" % (step, len(epoch_iterator), eval_losses.val))
@@ -150,7 +155,7 @@ def valid(model, ds_iter, epoch, checkpoint_path, global_step, best_dev_rmse, be
 
     return eval_losses.avg, best_dev_rmse, best_dev_mae, total_rmse, total_mae, update_cnt
 
-def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
+def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer, device, precision='fp32', compiled=False):
 # def train(model, optimizer, ds_iter, training_config, criterion):
 
     # TODO: Epoch당 loss, RMSE, MAE 추적 => TensorBoard 또는 파일 저장을 통해 tracing할 수 있도록.
@@ -167,12 +172,13 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
 
     model.train()
     init_t = time.time()
-    total_time = 0
     update_cnt = 0
     criterion = nn.MSELoss()
-    start = torch.cuda.Event(enable_timing=True)
-    end = torch.cuda.Event(enable_timing=True)
-    start.record()
+    timer = DeviceTimer(device)
+    # compiled model: compile time (first step of each batch shape) & steady-state step time
+    step_timer = ShapeTimer(device) if compiled else None
+    num_samples = 0
+    timer.start()
 
     # Training step
     for epoch in range(total_epochs):
@@ -185,15 +191,15 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
         
         for step, batch in enumerate(epoch_iterator):
             # 모델의 입력은 batch 그 자체, batch는 Dict이며 따라서 Dict 안의 tensor들을 device로 load.
-            batch['user_seq'] = batch['user_seq'].cuda()
-            batch['user_degree'] = batch['user_degree'].cuda()
-            batch['item_list'] = batch['item_list'].cuda()
-            batch['item_degree'] = batch['item_degree'].cuda()
-            batch['item_rating'] = batch['item_rating'].cuda()
-            batch['spd_matrix'] = batch['spd_matrix'].cuda()
+            batch = batch_to_device(batch, device)
+            num_samples += len(batch['user_seq'])
+            if step_timer is not None:
+                shape = tuple(batch['item_rating'].shape)
+                step_timer.start()
 
-            # forward pass
-            outputs, enc_loss, dec_loss = model(batch)
+            # forward pass (losses below are computed in fp32, outside autocast)
+            with autocast_context(device, precision):
+                outputs, enc_loss, dec_loss = model(batch)
 
             # compute loss
             # FIXME: 
@@ -205,11 +211,7 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
             # loss = criterion(outputs.float(), batch['item_rating'].float())
             
             #######
-            mask = (batch['item_rating'] != 0)
-
-            squared_diff = (outputs - batch['item_rating'])**2 * mask
-
-            org_loss = torch.sum(squared_diff) / torch.sum(mask)
+            org_loss = masked_mse_loss(batch['item_rating'], outputs)
             ##########
             
             #mse = F.mse_loss(outputs[mask].float(), batch['item_rating'][mask].float(), reduction='none')
@@ -223,9 +225,7 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
             #outputs = torch.mean(outputs,dim=1)
             #print(outputs.shape)
             
-            mask = (batch['item_rating'] != 0)
-            squared_diff = (outputs - batch['item_rating'])**2 * mask
-            new_loss = torch.sum(squared_diff) / torch.sum(mask)
+            new_loss = masked_mse_loss(batch['item_rating'], outputs)
 
             loss =  org_loss + new_loss * training_config["alpha"] + dec_loss * training_config["gamma"] + enc_loss * training_config["beta"] 
 
@@ -242,18 +242,18 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
             optimizer.step()
             lr_scheduler.step()
             #optimizer.zero_grad()
+            if step_timer is not None:
+                step_timer.stop(shape)
 
             losses.update(loss)
             epoch_iterator.set_description(
                         "Training (%d / %d Steps) (loss=%2.5f)" % (step, len(epoch_iterator), losses.val))
             
         # validation
-        end.record()
-        torch.cuda.synchronize()
-        total_time += (start.elapsed_time(end))
-        valid_loss, best_dev_rmse, best_dev_mae, valid_rmse, valid_mae, update_cnt = valid(model, ds_iter, epoch, checkpoint_path, step, best_dev_rmse, best_dev_mae, init_t, update_cnt)
+        timer.stop()
+        valid_loss, best_dev_rmse, best_dev_mae, valid_rmse, valid_mae, update_cnt = valid(model, ds_iter, epoch, checkpoint_path, step, best_dev_rmse, best_dev_mae, init_t, update_cnt, device, precision)
         model.train()
-        start.record()
+        timer.start()
 
         # Tensorboard recording
         # writer.add_scalar('Loss/Train', losses.avg, epoch)
@@ -274,20 +274,26 @@ def train(model, optimizer, lr_scheduler, ds_iter, training_config, writer):
 
     print('\n [Train Finished]')
     print("total training time (s): {}".format((time.time()-init_t)))
-    print("total training time (ms): {}".format(total_time))
-    print("peak memory usage (MB): {}".format(torch.cuda.memory_stats()['active_bytes.all.peak']>>20))
-    print("total memory usage (MB): {}".format(torch.cuda.memory_stats()['active_bytes.all.allocated']>>20))
-    print(torch.cuda.memory_summary(device=0))
+    print("total training time (ms): {}".format(timer.total))
+    print("training throughput (samples/sec): {:.1f}".format(num_samples / (timer.total / 1000)))
+    if step_timer is not None:
+        print(f"training {step_timer.summary()}")
+    memory = device_memory(device)
+    print("peak memory usage (MB): {}".format(memory['peak']))
+    print("total memory usage (MB): {}".format(memory['allocated']))
+    if device.type == 'cuda':
+        print(torch.cuda.memory_summary(device=device))
 
 
-def eval(model, ds_iter):
+def eval(model, ds_iter, device, precision='fp32', compiled=False):
 
     eval_losses = AverageMeter()
     model.eval()
 
-    start = torch.cuda.Event(enable_timing=True)
-    end = torch.cuda.Event(enable_timing=True)
-    start.record()
+    timer = DeviceTimer(device)
+    step_timer = ShapeTimer(device) if compiled else None
+    num_samples = 0
+    timer.start()
     with torch.no_grad():
         epoch_iterator = tqdm(ds_iter['test'],
                         desc="Validating (X / X Steps) (loss=X.X)",
@@ -299,13 +305,15 @@ def eval(model, ds_iter):
         for step, batch in enumerate(epoch_iterator):
             
             # 모델의 입력은 batch 그 자체, batch는 Dict이며 따라서 Dict 안의 tensor들을 device로 load.
-            batch['user_seq'] = batch['user_seq'].cuda()
-            batch['user_degree'] = batch['user_degree'].cuda()
-            batch['item_list'] = batch['item_list'].cuda()
-            batch['item_degree'] = batch['item_degree'].cuda()
-            batch['item_rating'] = batch['item_rating'].cuda()
-            batch['spd_matrix'] = batch['spd_matrix'].cuda()
-            outputs, enc_loss, dec_loss = model(batch)
+            batch = batch_to_device(batch, device)
+            num_samples += len(batch['user_seq'])
+            if step_timer is not None:
+                shape = tuple(batch['item_rating'].shape)
+                step_timer.start()
+            with autocast_context(device, precision):
+                outputs, enc_loss, dec_loss = model(batch)
+            if step_timer is not None:
+                step_timer.stop(shape)
 
             # loss = criterion(outputs.float(), batch['item_rating'].float())
             # FIXME: 
@@ -320,8 +328,7 @@ def eval(model, ds_iter):
             #outputs = torch.mean(outputs,dim=1)
             
             mask = (batch['item_rating'] != 0)
-            squared_diff = (outputs - batch['item_rating'])**2 * mask
-            loss = torch.sum(squared_diff) / torch.sum(mask)
+            loss = masked_mse_loss(batch['item_rating'], outputs)
             loss += enc_loss
             loss += dec_loss
             
@@ -337,9 +344,10 @@ def eval(model, ds_iter):
             # val_rmse.append(rmse)
             # val_mae.append(mae)
             
-            pred.append(outputs)
-            trg.append(batch['item_rating'])
-            msk.append(mask)
+            # flatten => batches of different (trimmed) item lengths can be concatenated
+            pred.append(outputs.reshape(-1))
+            trg.append(batch['item_rating'].reshape(-1))
+            msk.append(mask.reshape(-1))
 
             epoch_iterator.set_description(
                         "Evaluating (%d / %d Steps) (loss=%2.5f)" % (step, len(epoch_iterator), eval_losses.val))
@@ -356,18 +364,39 @@ def eval(model, ds_iter):
         total_rmse = torch.sqrt(mse.mean())
         total_mae = F.l1_loss(pred[msk].float(), trg[msk].float(), reduction='mean')
 
-    end.record()
-    torch.cuda.synchronize()
+    eval_time = timer.stop()
 
     print("\n [Evaluation Results]")
     print("Loss: %2.5f" % eval_losses.avg)
     print("RMSE: %2.5f" % total_rmse)
     print("MAE: %2.5f" % total_mae)
-    print(f"total eval time: {(start.elapsed_time(end))}")
-    print("peak memory usage (MB): {}".format(torch.cuda.memory_stats()['active_bytes.all.peak']>>20))
-    print("all memory usage (MB): {}".format(torch.cuda.memory_stats()['active_bytes.all.allocated']>>20))
+    print(f"total eval time: {eval_time}")
+    print("eval throughput (samples/sec): {:.1f}".format(num_samples / (eval_time / 1000)))
+    if step_timer is not None:
+        print(f"eval {step_timer.summary()}")
+    memory = device_memory(device)
+    print("peak memory usage (MB): {}".format(memory['peak']))
+    print("all memory usage (MB): {}".format(memory['allocated']))
 
     
+def get_loader(dataset, batch_size, shuffle, num_workers=8, batched=False, bucketing=False, bucket_sizes=(5, 10), static_shapes=None):
+    """
+    DataLoader of dataset.
+        batched: fetch each batch with one `MyDataset.__getitems__()` call (index arrays from `IndexBatchSampler`)
+        bucketing: batch samples of similar lengths (`BucketBatchSampler`) & trim padding of each batch (`TrimCollate`)
+        static_shapes: (user lengths, item lengths) trimmed batches are padded to (bucketing, `--compile`)
+    """
+    if bucketing and isinstance(dataset, MyDataset):
+        user_lengths, item_lengths = dataset.lengths()
+        batch_sampler = BucketBatchSampler(user_lengths, item_lengths, batch_size, shuffle=shuffle, user_bucket_size=bucket_sizes[0], item_bucket_size=bucket_sizes[1])
+        return DataLoader(dataset, batch_sampler=batch_sampler, num_workers=num_workers, collate_fn=TrimCollate(dataset.collate_fn, *(static_shapes or (None, None))))
+
+    if batched and isinstance(dataset, MyDataset):
+        batch_sampler = IndexBatchSampler(len(dataset), batch_size, shuffle=shuffle)
+        return DataLoader(dataset, batch_sampler=batch_sampler, num_workers=num_workers, collate_fn=dataset.collate_fn)
+
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers, collate_fn=getattr(dataset, 'collate_fn', None))
+
 def get_args():
     parser = argparse.ArgumentParser(description='Transformer for Social Recommendation')
     parser.add_argument("--mode", type = str, default="train",
@@ -385,6 +414,27 @@ def get_args():
     parser.add_argument('--num_layers_dec', type=int, default=2, help="num dec layers")
     parser.add_argument('--return_params', type=int, default=1, help="return param value for generating random sequence")
     parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--online', type=bool, default=False, help="generate train samples (random walks) on the fly in DataLoader workers")
+    parser.add_argument('--spd_mode', type=str, default="store", help="store // lazy (SPD of online samples)")
+    parser.add_argument('--edge_encoding', type=bool, default=False, help="add edge encoding bias (trust edge types on shortest paths) to encoder self-attention")
+    parser.add_argument('--max_edge_dist', type=int, default=5, help="max number of edges encoded per path (edge encoding)")
+    parser.add_argument('--fused_attention', type=bool, default=False, help="fused attention (F.scaled_dot_product_attention) where auxiliary attention losses are not needed (decoder self-attention, eval)")
+    parser.add_argument('--memory_report_interval', type=int, default=0, help="print memory usage of each DataLoader worker every N samples (0: no report)")
+    parser.add_argument('--lazy_dataset', type=bool, default=False, help="read samples from memory-mapped sample store on access (fast startup)")
+    parser.add_argument('--compact_dataset', type=bool, default=False, help="keep only id sequences per sample, gather rating & SPD blocks per batch")
+    parser.add_argument('--batched_loader', type=bool, default=False, help="fetch each batch with one dataset call (pre-stacked tensors) instead of per-sample dicts")
+    parser.add_argument('--bucketing', type=bool, default=False, help="batch samples of similar user & item lengths, and trim padding of each batch")
+    parser.add_argument('--user_bucket_size', type=int, default=5, help="width of user length buckets (bucketing)")
+    parser.add_argument('--item_bucket_size', type=int, default=10, help="width of item length buckets (bucketing)")
+    parser.add_argument('--device', type=str, default="auto", help="auto // cpu // cuda (auto: cuda if available)")
+    parser.add_argument('--num_threads', type=int, default=0, help="CPU intra-op threads (0: torch default)")
+    parser.add_argument('--num_interop_threads', type=int, default=0, help="CPU inter-op threads (0: torch default)")
+    parser.add_argument('--num_workers', type=int, default=8, help="number of DataLoader workers")
+    parser.add_argument('--compile', type=bool, default=False, help="torch.compile the model (static shapes, pads bucketed batches to --shape_buckets lengths)")
+    parser.add_argument('--compile_backend', type=str, default="inductor", help="torch.compile backend (inductor also runs on CPU)")
+    parser.add_argument('--compile_mode', type=str, default=None, help="torch.compile mode: default // reduce-overhead // max-autotune")
+    parser.add_argument('--shape_buckets', type=int, default=4, help="number of static user & item lengths of trimmed batches (--compile with --bucketing)")
+    parser.add_argument('--precision', type=str, default="fp32", help="fp32 // bf16 (bfloat16 autocast in train & eval, also on CPU)")
     
     args = parser.parse_args()
     return args
@@ -403,6 +453,9 @@ def main():
     training_config["learning_rate"] = args.lr
     model_config["num_layers_enc"] = args.num_layers_enc
     model_config["num_layers_dec"] = args.num_layers_dec
+    model_config["edge_encoding"] = args.edge_encoding
+    model_config["max_edge_dist"] = args.max_edge_dist
+    model_config["fused_attention"] = args.fused_attention
 
     ### log preparation ###
     log_dir = os.getcwd() + f'/logs/log_seed_{args.seed}/'
@@ -426,6 +479,13 @@ def main():
     torch.manual_seed(SEED)
     torch.backends.cudnn.deterministic = True
 
+    ### device preparation ###
+        # CPU thread pools must be set before any parallel work (e.g. model initialization)
+    device = get_device(args.device)
+    if device.type == 'cpu':
+        num_threads, num_interop_threads = setup_cpu_threads(args.num_threads, args.num_interop_threads)
+        print(f"CPU threads: {num_threads} (intra-op), {num_interop_threads} (inter-op)")
+
 
     ### model preparation ###
     print(model_config)
@@ -454,22 +514,37 @@ def main():
     # print(f"parameter_size: {[weight.size() for weight in model.parameters()]}", flush = True)
     # print(f"num_parameter: {np.sum([np.prod(weight.size()) for weight in model.parameters()])}", flush = True)
 
-    device_ids = list(range(torch.cuda.device_count()))
-    print(f"GPU list: {device_ids}")
-    model = model.cuda()
+    if device.type == 'cuda':
+        device_ids = list(range(torch.cuda.device_count()))
+        print(f"GPU list: {device_ids}")
+    model = model.to(device)
+
+    # static shapes of (bucketed) batches: each user & item length bucket, full & last batch, train & eval mode are compiled once
+    static_shapes = None
+    if args.compile:
+        num_shapes = 4
+        if args.bucketing and args.shape_buckets > 0:
+            static_shapes = (shape_buckets(args.user_seq_len, args.shape_buckets), shape_buckets(args.item_seq_len, args.shape_buckets))
+            num_shapes *= len(static_shapes[0]) * len(static_shapes[1])
+            print(f"static shape buckets: user {static_shapes[0]}, item {static_shapes[1]}")
+        model = compile_model(model, backend=args.compile_backend, mode=args.compile_mode, max_shapes=num_shapes)
 
     ### data preparation ###
 
     ### FIXME: 전체 데이터에 대해 파일 생성이 오래 걸림 (현재 시퀀스의 rating matrix 생성하는 부분이 문제로 보임)
         ### FIXME: (231012) validation set을 통해 모델이 잘 train 되는것은 확인했으므로, 바로 test를 진행하면서 model을 저장.
-    train_ds = MyDataset(dataset=args.dataset, split='train', seed=args.data_seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params)
+    # online: 매 epoch마다 새로운 random walk & item window로 train sample 생성 (test는 고정된 preprocessed data 사용)
+    if args.online:
+        train_ds = OnlineWalkDataset(dataset=args.dataset, split='train', seed=args.data_seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params, spd_mode=args.spd_mode, edge_encoding=args.edge_encoding, max_edge_dist=args.max_edge_dist)
+    else:
+        train_ds = MyDataset(dataset=args.dataset, split='train', seed=args.data_seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params, edge_encoding=args.edge_encoding, max_edge_dist=args.max_edge_dist, spd_mode=args.spd_mode, memory_report_interval=args.memory_report_interval, lazy=args.lazy_dataset, compact=args.compact_dataset, batched=args.batched_loader)
     # dev_ds = MyDataset(dataset=args.dataset, split='valid', seed=args.seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len)
-    test_ds = MyDataset(dataset=args.dataset, split='test', seed=args.data_seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params)
+    test_ds = MyDataset(dataset=args.dataset, split='test', seed=args.data_seed, user_seq_len=args.user_seq_len, item_seq_len=args.item_seq_len, return_params=args.return_params, edge_encoding=args.edge_encoding, max_edge_dist=args.max_edge_dist, spd_mode=args.spd_mode, memory_report_interval=args.memory_report_interval, lazy=args.lazy_dataset, compact=args.compact_dataset, batched=args.batched_loader)
 
     ds_iter = {
-            "train":DataLoader(train_ds, batch_size = training_config["batch_size"], shuffle=True, num_workers=8),
+            "train":get_loader(train_ds, batch_size = training_config["batch_size"], shuffle=True, num_workers=args.num_workers, batched=args.batched_loader, bucketing=args.bucketing, bucket_sizes=(args.user_bucket_size, args.item_bucket_size), static_shapes=static_shapes),
             # "dev":DataLoader(dev_ds, batch_size = training_config["batch_size"], shuffle=True, num_workers=4),
-            "test":DataLoader(test_ds, batch_size = training_config["batch_size"], shuffle=False, num_workers=8)
+            "test":get_loader(test_ds, batch_size = training_config["batch_size"], shuffle=False, num_workers=args.num_workers, batched=args.batched_loader, bucketing=args.bucketing, bucket_sizes=(args.user_bucket_size, args.item_bucket_size), static_shapes=static_shapes)
     }
 
     ### training preparation ###
@@ -505,7 +580,7 @@ def main():
     writer = SummaryWriter(os.path.join(log_dir,f"{args.name}.tensorboard"))
     ### train ###
     if args.mode == 'train':
-        train(model, optimizer, lr_scheduler, ds_iter, training_config, writer)
+        train(model, optimizer, lr_scheduler, ds_iter, training_config, writer, device, args.precision, args.compile)
         # train(model, optimizer, ds_iter, training_config, criterion)
 
     # Since train logging is done by TensorBoard, log only test result.
@@ -523,12 +598,13 @@ def main():
     ### eval ###
     print(checkpoint_path)
     if os.path.exists(checkpoint_path): #and checkpoint_path != os.getcwd() + '/checkpoints/test.model':
-        checkpoint = torch.load(checkpoint_path)
+        checkpoint = torch.load(checkpoint_path, map_location=device)
         model.load_state_dict(checkpoint["model_state_dict"])
         print("loading the best model from: " + checkpoint_path)
-        eval(model, ds_iter)
+        eval(model, ds_iter, device, args.precision, args.compile)
 
-    torch.cuda.empty_cache()
+    if device.type == 'cuda':
+        torch.cuda.empty_cache()
 
 
 if __name__ == '__main__':
@@ -14,22 +14,53 @@ import pandas as pd
 pyximport.install(setup_args={"include_dirs": np.get_include()})
 import algos
 
-def find_shortest_path_distance(data_path):
+from graph_utils import CSRGraph, all_pairs_shortest_path_distance
+from store_utils import LEGACY_SPD_FILE, SPD_STORE_FILE, SPDStore, load_spd_store
+
+def find_shortest_path_distance(data_path, method:str='floyd', cutoff:int=15, num_workers:int=1, overwrite:bool=False):
     """
     Based on Floyd-Warshall algorithm (implementation from Graphormer: `algos.pyx`), 
     compute all node's shortest path distance to all other nodes.
-    (Result array will saved to local for convenience.)
+    (Result is saved to local as uint8 SPD store (`shortest_path_result.spd`), and opened with np.memmap.)
+
+    With `method='bfs'`, run BFS from every node over CSR adjacency instead (social graph is unweighted & sparse).
+    Distances farther than `cutoff` are saved as `graph_utils.UNREACHABLE_SPD`.
 
     Args:
         data_path: path to dataset (social graph)
+        method: floyd // bfs
+        cutoff: max distance computed in BFS (`max_spd_value`)
+        num_workers: number of processes running BFS
+        overwrite: compute again even if pre-computed SPD store exists
+
+    Returns:
+        SPDStore
     """
-    if 'shortest_path_result.npy' in os.listdir(data_path):
+    # legacy `shortest_path_result.npy` is converted to SPD store, if exists.
+    if not overwrite and (SPD_STORE_FILE in os.listdir(data_path) or LEGACY_SPD_FILE in os.listdir(data_path)):
         print("Pre-computed shortest path matrix available...")
-        shortest_path_result = np.load(data_path + '/shortest_path_result.npy')
-
-        return shortest_path_result
+        return load_spd_store(data_path)
 
     social_file = data_path + '/trustnetwork.csv'
+    store_path = data_path + '/' + SPD_STORE_FILE
+
+    if method == 'bfs':
+        social_graph = CSRGraph.from_csv(social_file)
+
+        print("Start BFS SPD algorithm...")
+        start_time = time.time()
+        # BFS result is directly written to store file, not kept in memory.
+        shortest_path_result = SPDStore.create(store_path, num_nodes=social_graph.num_nodes)
+        all_pairs_shortest_path_distance(social_graph, cutoff=cutoff, num_workers=num_workers, out=shortest_path_result)
+        shortest_path_result.flush()
+        del shortest_path_result
+        print(f"Algorithm finished, time: {time.time() - start_time:.4f}s")
+
+        # Ciao: (7317, 7317) with size 53.5 MB
+        return SPDStore(store_path)
+    elif method != 'floyd':
+        raise ValueError(f"Unknown SPD method: {method}")
+
     dataframe = pd.read_csv(social_file, index_col=[])
 
     social_graph = nx.from_pandas_edgelist(dataframe, source='user_id_1', target='user_id_2')
@@ -40,14 +71,13 @@ def find_shortest_path_distance(data_path):
     shortest_path_result, path = algos.floyd_warshall(social_graph_adj)
     print(f"Algorithm finished, time: {time.time() - start_time:.4f}s")     # ciao: 221.0372 s // epinions: 3134.4668s
 
-    # Ciao: (7317, 7317) with size 428.3 MB
-    # Epinions: (18098, 18098) with size 2.6 GB
+    # Ciao: (7317, 7317) with size 53.5 MB
+    # Epinions: (18098, 18098) with size 327.5 MB
     start_time = time.time()
-    np.save(data_path + '/shortest_path_result.npy', shortest_path_result)
-    print(f"Finished saving .npy file, total time: {time.time() - start_time:.4f}s")
-    print("#### Call this function again to get computed result. ####")
+    spd_store = SPDStore.from_array(shortest_path_result, store_path)
+    print(f"Finished saving SPD store, total time: {time.time() - start_time:.4f}s")
 
-    return 0
+    return spd_store
 
 def generate_attn_pad_mask(seq_q, seq_k):
     """
@@ -60,6 +90,8 @@ def generate_attn_pad_mask(seq_q, seq_k):
                 0,    0,    0,    0,    0,    0,    0,    0]
     ==> mask: [ True,  True, False, False, False, False, False, False, False, False,
                 False, False, False, False, False, False, False, False, False, False]
+
+    Returns key padding mask [batch_size, 1, len_k], broadcast over queries (and heads) instead of materialized [batch_size, len_q, len_k].
     """
     # FIXME: (230911) 현재 mask 생성을 위한 입력으로 들어오는 shape은 다음과 같음.
         # Enc에선 [batch_size, seq_len_user, seq_len_user]
@@ -73,8 +105,9 @@ def generate_attn_pad_mask(seq_q, seq_k):
     # pad_attn_mask = seq_k.data.eq(0).unsqueeze(1)
     pad_attn_mask = (seq_k.data != 0).unsqueeze(1)      # FIXME: 0인 곳을 False(0)으로 두어야 softmax 거칠 시 0이 나옴.
 
-    # [batch_size, len_q, len_k]
-    return pad_attn_mask.expand(batch_size, len_q, len_k)
+    # key padding only => [batch_size, 1, len_k], broadcast over len_q (and heads) in attention
+    # return pad_attn_mask.expand(batch_size, len_q, len_k)
+    return pad_attn_mask
 
 def generate_attn_subsequent_mask(seq):
     """
@@ -91,8 +124,8 @@ def generate_attn_subsequent_mask(seq):
 if __name__ == "__main__":
     data_path = os.getcwd() + '/dataset/' + 'ciao'
 
-    array = find_shortest_path_distance(data_path)
-    # print(array.shape)
+    spd_store = find_shortest_path_distance(data_path)
+    # print(spd_store.matrix.shape)
     # print(np.max(array))
     # print(np.where(array == np.max(array)))
     # print(array[0][7020])
@@ -9,7 +9,7 @@ class DecoderLayer(nn.Module):
         fixed-length item sequences \n
         This items are interacted items of users in encoder's input random walk sequence.
     """
-    def __init__(self, d_model, d_ffn, num_heads, dropout=0.1, last_layer:bool=False, is_dec_layer:bool=True):
+    def __init__(self, d_model, d_ffn, num_heads, dropout=0.1, last_layer:bool=False, is_dec_layer:bool=True, fused_attention:bool=False):
         super(DecoderLayer, self).__init__()
 
         self.last_layer_flag = last_layer
@@ -17,12 +17,12 @@ class DecoderLayer(nn.Module):
 
         # Self attention
         self.norm1 = nn.LayerNorm(d_model)
-        self.attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads, is_dec_layer=self.dec_layer)
+        self.attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads, is_dec_layer=self.dec_layer, fused=fused_attention)
         self.dropout1 = nn.Dropout(p=dropout)
 
         # Multi-head attntion
         self.norm2 = nn.LayerNorm(d_model)
-        self.cross_attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads, is_dec_layer=self.dec_layer)
+        self.cross_attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads, is_dec_layer=self.dec_layer, fused=fused_attention)
         self.dropout2 = nn.Dropout(p=dropout)
 
         if not self.last_layer_flag:
@@ -8,22 +8,22 @@ class EncoderLayer(nn.Module):
     Input:
         fixed-length random walk sequence (generated from social graph)
     """
-    def __init__(self, d_model, d_ffn, num_heads, dropout=0.1):
+    def __init__(self, d_model, d_ffn, num_heads, dropout=0.1, fused_attention=False):
         super(EncoderLayer, self).__init__()
 
         self.norm1 = nn.LayerNorm(d_model)
-        self.attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads)
+        self.attention = MultiHeadAttention(d_model=d_model, num_heads=num_heads, fused=fused_attention)
         self.dropout1 = nn.Dropout(p=dropout)
 
         self.norm2 = nn.LayerNorm(d_model)
         self.ffn = FeedForwardNetwork(d_model=d_model, ffn_size=d_ffn, dropout=dropout)
         self.dropout2 = nn.Dropout(p=dropout)
     
-    def forward(self, x, src_mask, attn_bias):
+    def forward(self, x, src_mask, attn_bias, edge_bias=None):
         # 1. Perform self attention
         residual = x
         x = self.norm1(x)
-        x, spd_loss = self.attention(Q=x, K=x, V=x, mask=src_mask, attn_bias=attn_bias)
+        x, spd_loss = self.attention(Q=x, K=x, V=x, mask=src_mask, attn_bias=attn_bias, edge_bias=edge_bias)
 
         # 2. Add & Norm
         x = self.dropout1(x)
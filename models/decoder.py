@@ -11,7 +11,7 @@ class Decoder(nn.Module):
     Decoder for modeling item representation (in user-item graph),
     and perform rating prediction
     """
-    def __init__(self, num_item, max_degree, d_model, d_ffn, num_heads, dropout, num_layers):
+    def __init__(self, num_item, max_degree, d_model, d_ffn, num_heads, dropout, num_layers, fused_attention=False):
         """
         Args:
             data_path: path to dataset (ciao or epinions)
@@ -22,6 +22,7 @@ class Decoder(nn.Module):
             num_heads: number of heads in multi-headed attention
             dropout: dropout rate
             num_layers: number of encoder layers
+            fused_attention: fused attention (`F.scaled_dot_product_attention`) in self-attention, and in cross-attention in eval mode (no rating sign loss)
         """
         super(Decoder, self).__init__()
 
@@ -41,7 +42,8 @@ class Decoder(nn.Module):
                 num_heads = num_heads,
                 dropout = dropout,
                 last_layer = False,
-                is_dec_layer = True
+                is_dec_layer = True,
+                fused_attention = fused_attention
             ) for _ in range(num_layers)]
         )
 
@@ -54,7 +56,8 @@ class Decoder(nn.Module):
             num_heads = num_heads,
             dropout = dropout,
             last_layer = True,
-            is_dec_layer = True
+            is_dec_layer = True,
+            fused_attention = fused_attention
         )
 
         self.relu = nn.ReLU()
@@ -66,7 +69,7 @@ class Decoder(nn.Module):
 
         # Generate mask for padded data
             # FIXME: 현재 데이터/task 에선 subsequent masking에 의미가 X.
-        dec_self_attn_mask = generate_attn_pad_mask(batched_data['item_list'], batched_data['item_list']).cuda()    # [batch_size, seq_len_item, seq_len_item]
+        dec_self_attn_mask = generate_attn_pad_mask(batched_data['item_list'], batched_data['item_list'])    # [batch_size, 1, seq_len_item] (key padding, same device as batch)
         # print('\n<<<<<<<<<< Decoder의 self attention pad mask >>>>>>>>>>')
         # print(dec_self_attn_mask[0][:][0].data)
         # print(dec_self_attn_mask[0][:][0].shape)
@@ -80,15 +83,15 @@ class Decoder(nn.Module):
         # trg_mask = torch.gt((dec_self_attn_mask + dec_self_attn_subsequent_mask), 0)    # [batch_size, seq_len_item, seq_len_item]
         #trg_mask = dec_self_attn_mask
 
-        dec_enc_mask = generate_attn_pad_mask(batched_data['item_list'], batched_data['user_seq']).cuda()
+        dec_enc_mask = generate_attn_pad_mask(batched_data['item_list'], batched_data['user_seq'])
         #src_mask = dec_enc_mask     # [batch_size, seq_len_item, seq_len_user]
 
         # del dec_self_attn_mask, dec_self_attn_subsequent_mask, dec_enc_mask
         #del dec_self_attn_mask, dec_enc_mask
 
         # Rating encoding
-            # [batch_size, seq_length_user, seq_length_item, num_heads]
-            # ==> [batch_size, num_heads, seq_length_user, seq_length_item]
+            # [batch_size, seq_length_user, seq_length_item, 1]
+            # ==> [batch_size, 1, seq_length_item, seq_length_user] (broadcast over heads)
         attn_bias = self.relation_bias(batched_data).permute(0, 3, 2, 1)
         #attn_bias=None
         losses = []
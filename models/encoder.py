@@ -10,7 +10,7 @@ class Encoder(nn.Module):
     Encoder for modeling user representation (in social graph)
     """
     # def __init__(self, max_degree, num_user, d_model, d_ffn, num_heads, dropout, num_layers):
-    def __init__(self, max_degree, num_user, max_spd_value, d_model, d_ffn, num_heads, dropout, num_layers):
+    def __init__(self, max_degree, num_user, max_spd_value, d_model, d_ffn, num_heads, dropout, num_layers, edge_encoding=False, max_edge_dist=5, fused_attention=False):
         """
         Args:
             data_path: path to dataset (ciao or epinions)
@@ -22,6 +22,9 @@ class Encoder(nn.Module):
             num_heads: number of heads in multi-headed attention
             dropout: dropout rate
             num_layers: number of encoder layers
+            edge_encoding: add edge encoding bias (trust edge types on shortest paths) to self-attention score
+            max_edge_dist: max number of edges encoded per path
+            fused_attention: fused attention (`F.scaled_dot_product_attention`) in eval mode (no SPD loss)
         """
         super(Encoder, self).__init__()
 
@@ -40,14 +43,17 @@ class Encoder(nn.Module):
                 d_model = d_model,
                 d_ffn = d_ffn,
                 num_heads = num_heads,
-                dropout = dropout
+                dropout = dropout,
+                fused_attention = fused_attention
             ) for _ in range(num_layers)]
         )
 
         self.spatial_pos_bias = SpatialEncoder(
             # num_nodes = self.num_user,
             max_spd_value = self.max_spd_value,
-            num_heads = num_heads
+            num_heads = num_heads,
+            edge_encoding = edge_encoding,
+            max_edge_dist = max_edge_dist
         )
     
     def forward(self, batched_data):
@@ -59,19 +65,24 @@ class Encoder(nn.Module):
         src_mask = generate_attn_pad_mask(batched_data['user_seq'], batched_data['user_seq'])
 
         # Spatial Encoding
-            # [batch_size, seq_length, seq_length, num_heads] ==> [batch_size, num_heads, seq_length, seq_length]
+            # [batch_size, seq_length, seq_length, 1] ==> [batch_size, 1, seq_length, seq_length] (broadcast over heads)
         attn_bias = self.spatial_pos_bias(batched_data).permute(0, 3, 2, 1)
 
         ### Ablation study: No attn_bias
         #attn_bias = None
         ###
+
+        # Edge Encoding (None if disabled)
+            # [batch_size, num_heads, seq_length, seq_length]
+        edge_bias = self.spatial_pos_bias.edge_bias(batched_data)
+
         losses = []
         # Encoder layer forward pass (MHA, FFN)
         for layer in self.enc_layers:
-            x, spd_loss = layer(x, src_mask, attn_bias)
+            x, spd_loss = layer(x, src_mask, attn_bias, edge_bias)
             losses.append(spd_loss)
 
-        del src_mask, attn_bias
+        del src_mask, attn_bias, edge_bias
         # x: [batch_size, seq_length, d_model]
             # src_mask will be used in encoder-decoder cross attention.
         return x, sum(losses)/len(losses)
\ No newline at end of file
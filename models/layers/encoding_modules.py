@@ -62,10 +62,19 @@ class SpatialEncoder(nn.Module):
         num_heads: number of heads in multi-head attention
         num_nodes: total number of users in social graph. (before splitting)
     """
-    def __init__(self, num_heads, max_spd_value):
+    def __init__(self, num_heads, max_spd_value, edge_encoding=False, max_edge_dist=5, num_edge_types=4):
         super(SpatialEncoder, self).__init__()
         
         self.num_heads = num_heads
+        self.edge_encoding = edge_encoding
+
+        # (optional) Graphormer-style edge encoding: shortest path 위 trust edge type들의 embedding 평균
+            # edge type: 0 (padding) // 1 (forward) // 2 (backward) // 3 (mutual), see `graph_utils.EdgePathEncoder`
+        if edge_encoding:
+            self.max_edge_dist = max_edge_dist
+            self.edge_encoder = nn.Embedding(num_edge_types, num_heads, padding_idx=0)
+            # hop마다 다른 [num_heads, num_heads] projection
+            self.edge_dis_encoder = nn.Parameter(torch.randn(max_edge_dist, num_heads, num_heads) / num_heads)
         
         # # lookup table은 spatial-pos table에 있는 거리 값을 dense vector representation으로 변환
         #     # 현재 spatial_pos_table에 있는 값중 max값은 unreachable 거리이고, 이는 num_nodes + 1.
@@ -81,12 +90,36 @@ class SpatialEncoder(nn.Module):
             # [batch_size, seq_length_user, seq_length_user]
         spd_matrix = batched_data['spd_matrix']
 
-        # [batch_size, seq_length, seq_length] ==> [num_heads, batch_size, seq_length, seq_length] ==> [batch_size, seq_length, seq_length, num_heads]
-        attn_bias = spd_matrix.repeat(self.num_heads, 1, 1, 1).permute(1, 2, 3, 0)
+        # same bias for every head => no per-head copy, broadcast over heads in attention
+        # [batch_size, seq_length, seq_length] ==> [batch_size, seq_length, seq_length, 1]
+        # attn_bias = spd_matrix.repeat(self.num_heads, 1, 1, 1).permute(1, 2, 3, 0)
+        attn_bias = spd_matrix.unsqueeze(-1)
         # attn_bias = self.spatial_pos_encoder(spd_matrix)
 
         return attn_bias
 
+    def edge_bias(self, batched_data):
+        """
+        Edge encoding bias added to attention score (None if edge encoding is disabled)
+            batched_data['edge_path']: [batch_size, seq_length, seq_length, max_edge_dist] edge types on shortest paths
+        """
+        if not self.edge_encoding:
+            return None
+
+        edge_path = batched_data['edge_path'][..., :self.max_edge_dist]
+        max_dist = edge_path.size(-1)
+
+        # [batch_size, seq_length, seq_length, max_dist, num_heads]
+        edge_embedding = self.edge_encoder(edge_path)
+        edge_embedding = torch.einsum('blmdh,dhk->blmk', edge_embedding, self.edge_dis_encoder[:max_dist])
+
+        # 경로 길이로 평균 (길이 0: 자기 자신 // 도달 불가 // padding)
+        path_length = (edge_path != 0).sum(dim=-1, keepdim=True).clamp(min=1)
+        edge_embedding = edge_embedding / path_length
+
+        # [batch_size, seq_length, seq_length, num_heads] ==> [batch_size, num_heads, seq_length, seq_length]
+        return edge_embedding.permute(0, 3, 1, 2)
+
 class ItemNodeEncoder(nn.Module):
     """
     Embed node id to dense representation & Encode each node's degree information.
@@ -157,10 +190,11 @@ class RatingEncoder(nn.Module):
 
         # Q*K^T 를 수행하면 [batch_size, num_heads, seq_length_item, seg_length_user]
         # 여기에 bias term으로 더해주므로 [batch_size, seq_length_user, seq_length_item] ==> [batch_size, num_heads, seq_length_user, seq_length_item] 이 되어야 함. -> decoder 부분에서 수행
+            # same bias for every head => no per-head copy, broadcast over heads in attention
             # [batch_size, seq_length_user, seq_length_item] 
-            # ==> [num_heads, batch_size, seq_length_user, seq_length_item]
-            # ==> [batch_size, seq_length_user, seq_length_item, num_heads]
-        attn_bias = item_rating.repeat(self.num_heads, 1, 1, 1).permute(1, 2, 3, 0)
+            # ==> [batch_size, seq_length_user, seq_length_item, 1]
+        # attn_bias = item_rating.repeat(self.num_heads, 1, 1, 1).permute(1, 2, 3, 0)
+        attn_bias = item_rating.unsqueeze(-1)
 
         return attn_bias
 
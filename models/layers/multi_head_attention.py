@@ -8,16 +8,22 @@ class ScaledDotProductAttention(nn.Module):
     """
     Perform scaled dot product attention
     """
-    def __init__(self, is_enc=False):
+    def __init__(self, is_enc=False, fused=False):
         super(ScaledDotProductAttention, self).__init__()
         if is_enc:
             self.spd_param = nn.Parameter(torch.randn((30, 30), dtype=torch.float, requires_grad=True))
+        self.fused = fused
     
-    def forward(self, Q, K, V, mask=None, attn_bias=None, last_layer_flag=False, is_dec_layer=False):
+    def forward(self, Q, K, V, mask=None, attn_bias=None, last_layer_flag=False, is_dec_layer=False, edge_bias=None):
         # Input is 4-d tensor
             # [batch_size, head, length, d_tensor]
         batch_size, head, length, d_tensor = K.size()
 
+        # (optional) fused attention: score is not materialized => no auxiliary (attention bias) loss
+            # used only where the loss is not needed: no attention bias (decoder self-attention) or eval mode
+        if self.fused and not last_layer_flag and (attn_bias is None or not self.training):
+            return self.fused_attention(Q, K, V, mask, edge_bias), 0
+
         # 1. Compute similarity by Q.dot(K^T)
             # d_tensor = d_model // num_head
             # [batch_size, num_heads, seq_length, d_tensor] ==> [batch_size, num_heads, d_tensor, seq_length]
@@ -26,6 +32,11 @@ class ScaledDotProductAttention(nn.Module):
             # ==> [batch_size, num_heads, seq_length, seq_length]
         # print(f"////// After Q*KT: {score.shape}")
 
+        # (optional) edge encoding bias
+            # [batch_size, num_heads, seq_length, seq_length]
+        if edge_bias is not None:
+            score = score + edge_bias
+
         # 2. Apply attention mask
         if mask is not None:
             # print(score.shape)
@@ -59,19 +70,22 @@ class ScaledDotProductAttention(nn.Module):
                 #score += self.spd_param
                 #print(self.spd_param.dtype)
                 attn_bias = torch.where(attn_bias == 0, 1, 1/(attn_bias)**2)
-                loss = torch.sqrt(F.mse_loss(score.float(), attn_bias.float())) / (batch_size*head*length*length)
+                    # attn_bias: [batch_size, 1, seq_length, seq_length], expanded (view) over heads
+                loss = torch.sqrt(F.mse_loss(score.float(), attn_bias.float().expand_as(score))) / (batch_size*head*length*length)
                 #print(loss)
                 #loss = 0
                 #score += attn_bias
 
         ### Decoder 마지막 layer에서 Q * K.T 한 결과를 output으로 출력
         if last_layer_flag:
-            score = torch.mean(score, dim=1)
+            # rating prediction in fp32 (score may be bf16 under autocast)
+            score = torch.mean(score.float(), dim=1)
             return score, loss
         ###
 
         # 3. Pass score to softmax for making [0, 1] range.
-        score = torch.softmax(score, dim=-1)
+            # softmax in fp32 (bf16 autocast), cast back to dtype of V for matmul
+        score = torch.softmax(score, dim=-1, dtype=torch.float).to(V.dtype)
         # print("\n##### Q * K + masking 에 softmax 결과 #####")
         # print(score[0][:][0][0].data)
         # quit()
@@ -90,15 +104,37 @@ class ScaledDotProductAttention(nn.Module):
         # return V, score
         return V, loss
 
+    def fused_attention(self, Q, K, V, mask=None, edge_bias=None):
+        """
+        softmax(Q*K^T / sqrt(d_tensor) + edge_bias, masked) * V with `F.scaled_dot_product_attention`
+        (boolean mask, or additive mask with edge bias).
+        Rows with all keys masked attend uniformly (mean of V), same as masked_fill(-10000) in `forward`.
+        """
+        attn_mask = None
+        if mask is not None:
+            keep = (mask != 0)
+            empty = ~keep.any(dim=-1, keepdim=True)
+                # [batch_size, 1, 1, 1] (key padding mask)
+            attn_mask = keep | empty
+        if edge_bias is not None:
+            bias = edge_bias.to(Q.dtype)
+            attn_mask = bias if attn_mask is None else bias.masked_fill(~attn_mask, float('-inf'))
+
+        out = F.scaled_dot_product_attention(Q, K, V, attn_mask=attn_mask)
+        if mask is not None:
+            out = torch.where(empty, V.mean(dim=-2, keepdim=True), out)
+
+        return out
+
 class MultiHeadAttention(nn.Module):
     """
     Perform multi-head attention
     """
-    def __init__(self, d_model, num_heads, last_layer_flag=False, is_dec_layer=False):
+    def __init__(self, d_model, num_heads, last_layer_flag=False, is_dec_layer=False, fused=False):
         super(MultiHeadAttention, self).__init__()
 
         self.num_heads = num_heads
-        self.attention = ScaledDotProductAttention(not is_dec_layer)
+        self.attention = ScaledDotProductAttention(not is_dec_layer, fused)
         self.last_layer_flag = last_layer_flag
         self.is_dec_layer = is_dec_layer
 
@@ -109,7 +145,7 @@ class MultiHeadAttention(nn.Module):
 
         self.W_concat = nn.Linear(d_model, d_model)
 
-    def forward(self, Q, K, V, mask=None, attn_bias=None):
+    def forward(self, Q, K, V, mask=None, attn_bias=None, edge_bias=None):
         # print("Am I in Decoder???????", self.is_dec_layer)
         # 1. Dot produt with weight matrices
             # [batch_size, seq_length, d_model]
@@ -121,15 +157,15 @@ class MultiHeadAttention(nn.Module):
         Q, K, V = self.split(Q), self.split(K), self.split(V)
 
         # Apply mask for multi-head attention
-            # [batch_size, len_q, len_k] ==> [batch_size, num_heads, len_q, len_k]
+            # [batch_size, 1, len_k] ==> [batch_size, 1, 1, len_k] (view, broadcast over heads & queries)
         if mask is not None:
-            mask = mask.unsqueeze(1).repeat(1, self.num_heads, 1, 1)
+            mask = mask.unsqueeze(1)
 
         ####### Decoder의 마지막 layer (cross-attn)는 rating prediction을 수행
         if not self.last_layer_flag:
             # 3. Perform scaled-dot product attention
             # out, attn = self.attention(Q, K, V, mask, attn_bias)
-            out, loss = self.attention(Q, K, V, mask, attn_bias, self.last_layer_flag, self.is_dec_layer)
+            out, loss = self.attention(Q, K, V, mask, attn_bias, self.last_layer_flag, self.is_dec_layer, edge_bias)
         else:
             # print(f"        Last Layer shapes : Q ({Q.shape})   K ({K.shape})   V ({V.shape})")
             out, loss = self.attention(Q, K, V, mask, attn_bias, self.last_layer_flag, self.is_dec_layer)
@@ -6,7 +6,7 @@ from models.decoder import Decoder
 
 class Transformer(nn.Module):
     # def __init__(self, num_user, max_degree_user, num_item, max_degree_item, d_model, d_ffn, num_heads, dropout, num_layers_enc, num_layers_dec):
-    def __init__(self, num_user, max_degree_user, max_spd_value, num_item, max_degree_item, d_model, d_ffn, num_heads, dropout, num_layers_enc, num_layers_dec):
+    def __init__(self, num_user, max_degree_user, max_spd_value, num_item, max_degree_item, d_model, d_ffn, num_heads, dropout, num_layers_enc, num_layers_dec, edge_encoding=False, max_edge_dist=5, fused_attention=False):
         super(Transformer, self).__init__()
 
         self.encoder = Encoder(
@@ -17,7 +17,10 @@ class Transformer(nn.Module):
             d_ffn=d_ffn,
             num_heads=num_heads,
             dropout=dropout,
-            num_layers=num_layers_enc
+            num_layers=num_layers_enc,
+            edge_encoding=edge_encoding,
+            max_edge_dist=max_edge_dist,
+            fused_attention=fused_attention
         )
 
         self.decoder = Decoder(
@@ -27,7 +30,8 @@ class Transformer(nn.Module):
             d_ffn=d_ffn,
             num_heads=num_heads,
             dropout=dropout,
-            num_layers=num_layers_dec
+            num_layers=num_layers_dec,
+            fused_attention=fused_attention
         )
     
     def forward(self, batched_data):
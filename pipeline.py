@@ -0,0 +1,301 @@
+"""
+Incremental preprocessing pipeline (stage graph), used in `data_making.py`.
+
+Each stage's key is a hash of
+    - its name & parameters (dataset, seed, split, walk length, ...)
+    - keys of its upstream stages
+    - contents of its raw source files (e.g. `rating.csv`, `trustnetwork.csv`)
+and key of the stage which produced each output file is recorded in `.pipeline_state.json` of dataset directory.
+A stage is skipped if all its outputs exist & were produced with the same key,
+so changing a parameter only rebuilds the stages depending on it.
+
+`Scheduler` runs stages of several pipelines (e.g. sweep over seeds & walk lengths) together:
+identical stages of different pipelines are run once, and independent stages run concurrently in a process pool.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+PIPELINE_STATE_FILE = '.pipeline_state.json'
+PIPELINE_VERSION = 1
+
+class Stage:
+    def __init__(self, name:str, run, outputs, params:dict=None, deps:list=(), sources:list=(), memory:float=None):
+        """
+        Args:
+            name: unique stage name (e.g. `walk_train`)
+            run: function building outputs, called without arguments
+            outputs: output file names (relative to data path), or function returning them
+                (for names only known after upstream stages are built)
+            params: parameters affecting outputs (must be json serializable)
+            deps: names of upstream stages
+            sources: raw input file names, hashed by content
+            memory: estimated peak memory (MB) of stage, used by `Scheduler` (default: scheduler's `job_memory`)
+        """
+        self.name = name
+        self.run = run
+        self._outputs = outputs
+        self.params = params or {}
+        self.deps = list(deps)
+        self.sources = list(sources)
+        self.memory = memory
+
+    @property
+    def outputs(self) -> list:
+        return list(self._outputs() if callable(self._outputs) else self._outputs)
+
+class Pipeline:
+    def __init__(self, data_path:str):
+        self.data_path = data_path
+        self.stages = {}
+        self.keys = {}
+        self.identities = {}
+
+        self.state_path = os.path.join(data_path, PIPELINE_STATE_FILE)
+        self.state = {'files': {}, 'outputs': {}}
+        if os.path.isfile(self.state_path):
+            with open(self.state_path) as file:
+                self.state = json.load(file)
+
+    def add(self, stage:Stage) -> Stage:
+        """
+        Add stage, upstream stages should be added first.
+        """
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicated stage: {stage.name}")
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"Unknown upstream stage of {stage.name}: {dep}")
+
+        self.stages[stage.name] = stage
+
+        return stage
+
+    def outputs(self, name:str) -> list:
+        return [os.path.join(self.data_path, output) for output in self.stages[name].outputs]
+
+    def file_hash(self, file_name:str) -> str:
+        """
+        Content hash of raw source file (re-hashed only when size or mtime changed).
+        """
+        path = os.path.join(self.data_path, file_name)
+        stat = os.stat(path)
+        cached = self.state['files'].get(file_name)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+            return cached['sha1']
+
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha1.update(block)
+        self.state['files'][file_name] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': sha1.hexdigest()}
+
+        return sha1.hexdigest()
+
+    def key(self, name:str) -> str:
+        if name not in self.keys:
+            stage = self.stages[name]
+            content = {
+                'version': PIPELINE_VERSION,
+                'name': name,
+                'params': stage.params,
+                'deps': {dep: self.key(dep) for dep in stage.deps},
+                'sources': {source: self.file_hash(source) for source in stage.sources},
+            }
+            self.keys[name] = hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+        return self.keys[name]
+
+    def identity(self, name:str) -> str:
+        """
+        Key without contents of source files, used to find identical stages of different pipelines
+        before sources are built (e.g. `rating.csv` by `mat` stage).
+        """
+        if name not in self.identities:
+            stage = self.stages[name]
+            content = {
+                'data_path': os.path.abspath(self.data_path),
+                'name': name,
+                'params': stage.params,
+                'deps': {dep: self.identity(dep) for dep in stage.deps},
+                'sources': stage.sources,
+            }
+            self.identities[name] = hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+        return self.identities[name]
+
+    def is_up_to_date(self, name:str) -> bool:
+        key = self.key(name)
+        for output in self.stages[name].outputs:
+            if self.state['outputs'].get(output) != key or not os.path.exists(os.path.join(self.data_path, output)):
+                return False
+
+        return True
+
+    def save_state(self):
+        # write & rename => state file is never half-written
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.state, file, indent=4, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+    def record(self, name:str):
+        for output in self.stages[name].outputs:
+            self.state['outputs'][output] = self.key(name)
+        self.save_state()
+
+    def run(self, force:bool=False) -> dict:
+        """
+        Run all stages in order, skipping up-to-date ones.
+
+        Args:
+            force: rebuild all stages
+
+        Returns:
+            {stage name: 'built' // 'skipped'}
+        """
+        result = Scheduler().add(self).run(force=force)
+
+        return {name: result[self.identity(name)] for name in self.stages}
+
+
+# stages run by scheduler's forked workers, {identity: Stage}
+_scheduled_stages = {}
+
+def _run_stage(stage:Stage) -> float:
+    start_time = time.time()
+    stage.run()
+
+    return time.time() - start_time
+
+def _run_scheduled_stage(identity:str) -> float:
+    return _run_stage(_scheduled_stages[identity])
+
+class Scheduler:
+    """
+    Run stages of multiple pipelines, as soon as their upstream stages are done.
+
+    - Stages with same identity (same data path, name, parameters & upstream stages) are run once.
+    - Up to `num_workers` stages run concurrently in forked processes,
+      while sum of their memory estimates stays within `memory_budget` (at least one stage always runs).
+    - Pipeline state is only written by the scheduler process.
+    """
+    def __init__(self, num_workers:int=1, memory_budget:float=None, job_memory:float=0):
+        """
+        Args:
+            num_workers: number of concurrently running stages (1: run in current process)
+            memory_budget: max total memory (MB) of running stages (default: no limit)
+            job_memory: memory estimate (MB) of stage without `memory`
+        """
+        self.num_workers = num_workers
+        self.memory_budget = memory_budget
+        self.job_memory = job_memory
+
+        self.pipelines = {}         # data path -> pipeline owning state
+        self.nodes = {}             # identity -> (pipeline, stage name)
+        self.producers = {}         # (data path, output) -> identity
+
+    def add(self, pipeline:Pipeline) -> 'Scheduler':
+        # pipelines of same data path share one state
+        data_path = os.path.abspath(pipeline.data_path)
+        owner = self.pipelines.setdefault(data_path, pipeline)
+        pipeline.state = owner.state
+
+        for name, stage in pipeline.stages.items():
+            identity = pipeline.identity(name)
+            if identity in self.nodes:
+                continue
+            self.nodes[identity] = (pipeline, name)
+
+            # outputs known in advance must not be produced by two different stages (e.g. sweep over `--spd_cutoff`)
+            if not callable(stage._outputs):
+                for output in stage.outputs:
+                    other = self.producers.setdefault((data_path, output), identity)
+                    if other != identity:
+                        raise ValueError(f"`{output}` is produced by different `{name}` stages in {data_path}, run them separately.")
+
+        return self
+
+    def memory(self, identity:str) -> float:
+        pipeline, name = self.nodes[identity]
+        memory = pipeline.stages[name].memory
+
+        return self.job_memory if memory is None else memory
+
+    def run(self, force:bool=False) -> dict:
+        """
+        Returns:
+            {stage identity: 'built' // 'skipped'}
+        """
+        global _scheduled_stages
+
+        # run after upstream stages & stages producing source files (e.g. `mat` => `rating.csv`)
+        deps = {}
+        for identity, (pipeline, name) in self.nodes.items():
+            stage = pipeline.stages[name]
+            data_path = os.path.abspath(pipeline.data_path)
+            deps[identity] = {pipeline.identity(dep) for dep in stage.deps}
+            deps[identity].update(self.producers[(data_path, source)] for source in stage.sources if (data_path, source) in self.producers)
+        pending = list(self.nodes)
+        running = {}
+        result = {}
+
+        use_pool = self.num_workers > 1 and 'fork' in multiprocessing.get_all_start_methods()
+        if use_pool:
+            # forked workers inherit stages (closures can't be pickled)
+            _scheduled_stages = {identity: pipeline.stages[name] for identity, (pipeline, name) in self.nodes.items()}
+            executor = ProcessPoolExecutor(self.num_workers, mp_context=multiprocessing.get_context('fork'))
+
+        try:
+            while pending or running:
+                used_memory = sum(self.memory(identity) for identity in running.values())
+
+                for identity in list(pending):
+                    if not deps[identity] <= result.keys():
+                        continue
+                    pipeline, name = self.nodes[identity]
+
+                    if not force and pipeline.is_up_to_date(name):
+                        print(f"[pipeline] {name}: up to date ({pipeline.key(name)[:10]})")
+                        result[identity] = 'skipped'
+                        pending.remove(identity)
+                        continue
+
+                    if use_pool and len(running) >= self.num_workers:
+                        break
+                    if running and self.memory_budget is not None and used_memory + self.memory(identity) > self.memory_budget:
+                        continue
+
+                    print(f"[pipeline] {name}: building ({pipeline.key(name)[:10]})...")
+                    pending.remove(identity)
+                    if use_pool:
+                        running[executor.submit(_run_scheduled_stage, identity)] = identity
+                        used_memory += self.memory(identity)
+                    else:
+                        self._finish(identity, _run_stage(pipeline.stages[name]))
+                        result[identity] = 'built'
+
+                if not running:
+                    if pending and not any(deps[identity] <= result.keys() for identity in pending):
+                        raise RuntimeError(f"Stages with unresolved upstream: {[self.nodes[identity][1] for identity in pending]}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    identity = running.pop(future)
+                    self._finish(identity, future.result())
+                    result[identity] = 'built'
+        finally:
+            if use_pool:
+                executor.shutdown(cancel_futures=True)
+                _scheduled_stages = {}
+
+        return result
+
+    def _finish(self, identity:str, elapsed:float):
+        pipeline, name = self.nodes[identity]
+        pipeline.record(name)
+        print(f"[pipeline] {name}: built, time: {elapsed:.4f}s")
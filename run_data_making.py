@@ -1,25 +1,33 @@
-import subprocess
-import requests
-import json
-from datetime import datetime
+"""
+Preprocess whole sweep grid at once (seed x dataset x (walk length, item length) x return_params).
+
+Stages of all configurations are run by one `pipeline.Scheduler`:
+shared stages (e.g. split & degree tables of same seed) are run once,
+and independent stages run concurrently within memory budget.
+"""
+import itertools
 import os
-import torch
+
+import data_making
+from pipeline import Scheduler
 
 seed = ["42"]
 datasets = ['ciao']
 user_item = [(30,100)]
+rps = ['1']
+
+NUM_JOBS = 4                # number of concurrently running stages
+MEMORY_BUDGET = None        # max total memory (MB) of running stages (None: no limit)
+JOB_MEMORY = 0              # estimated memory (MB) of each stage
 
 #python3 data_making.py --dataset "$DATASET" --first True --seed 42 --test_ratio 0.1 --random_walk_len "$RANDOM_WALK_LEN" --item_seq_len "$ITEM_SEQ_LEN"
-rps = ['1']
-for s in seed:
-    for d in datasets:
-        for (u, i) in user_item:
-            for rp in rps:
-                path = f"./dataset/{d}/sequence_data_seed_{s}_walk_{u}_itemlen_{i}_rp_{rp}_.pkl"
-                print(path)
-                if not os.path.isfile(path):
-                    torch.cuda.empty_cache()
-                    subprocess.run(['python', 'data_making.py', '--seed', s, '--dataset', d, '--random_walk_len', str(u), '--item_seq_len', str(i), '--return_params', rp])
-                    torch.cuda.empty_cache()
-                else:
-                    print(f"Exists!")
+if __name__ == "__main__":
+    scheduler = Scheduler(num_workers=NUM_JOBS, memory_budget=MEMORY_BUDGET, job_memory=JOB_MEMORY)
+
+    for s, d, (u, i), rp in itertools.product(seed, datasets, user_item, rps):
+        args = data_making.get_args(['--seed', s, '--dataset', d, '--random_walk_len', str(u), '--item_seq_len', str(i), '--return_params', rp])
+        print(f"dataset: {d}, seed: {s}, walk: {u}, itemlen: {i}, rp: {rp}")
+        scheduler.add(data_making.build_pipeline(args, os.getcwd() + '/dataset/' + d))
+
+    result = scheduler.run()
+    print(f"built: {list(result.values()).count('built')}, up to date: {list(result.values()).count('skipped')}")
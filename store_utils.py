@@ -0,0 +1,547 @@
+"""
+On-disk stores for preprocessed data, read through np.memmap (shared by processes via page cache).
+
+    - SPDStore: [num_nodes, num_nodes] uint8 SPD matrix of social graph (replaces `shortest_path_result.npy`)
+    - RatingStore: sparse user-item rating matrix (replaces dense `rating_matrix.npy`)
+    - SampleStore: columnar & sharded model input samples (replaces `sequence_data_*.pkl`)
+    - degree lookup: id-indexed degree array saved next to degree table .csv
+"""
+import bisect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from graph_utils import UNREACHABLE_SPD
+
+SPD_STORE_FILE = 'shortest_path_result.spd'
+LEGACY_SPD_FILE = 'shortest_path_result.npy'
+RATING_STORE_FILE = 'rating_matrix.npz'
+LEGACY_RATING_FILE = 'rating_matrix.npy'
+
+class SPDStore:
+    """
+    SPD matrix stored as uint8 with a small header, opened as read-only np.memmap.
+
+    File layout:
+        header (32 bytes): magic `SPDSTORE` | num_nodes (uint64) | unreachable (uint64) | version (uint64)
+        body: row-major [num_nodes, num_nodes] uint8 matrix, indexed by (user id - 1)
+    """
+    MAGIC = b'SPDSTORE'
+    VERSION = 1
+    HEADER_SIZE = 32
+
+    def __init__(self, path:str):
+        self.path = path
+
+        with open(path, 'rb') as file:
+            header = file.read(self.HEADER_SIZE)
+        if header[:8] != self.MAGIC:
+            raise ValueError(f"Not a SPD store file: {path}")
+
+        num_nodes, unreachable, version = np.frombuffer(header[8:], dtype='<u8')
+        if version != self.VERSION:
+            raise ValueError(f"Unsupported SPD store version {version}: {path}")
+
+        self.num_nodes = int(num_nodes)
+        self.unreachable = int(unreachable)
+        self.matrix = np.memmap(path, dtype=np.uint8, mode='r', offset=self.HEADER_SIZE, shape=(self.num_nodes, self.num_nodes))
+
+    # memmap is re-opened instead of being pickled (e.g. sending to DataLoader workers)
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @classmethod
+    def create(cls, path:str, num_nodes:int, unreachable:int=UNREACHABLE_SPD) -> np.memmap:
+        """
+        Create empty store file and return writable [num_nodes, num_nodes] memmap of its body.
+        (Call `.flush()` after writing, then open with `SPDStore(path)`.)
+        """
+        header = cls.MAGIC + np.array([num_nodes, unreachable, cls.VERSION], dtype='<u8').tobytes()
+        with open(path, 'wb') as file:
+            file.write(header)
+            file.truncate(cls.HEADER_SIZE + num_nodes * num_nodes)
+
+        return np.memmap(path, dtype=np.uint8, mode='r+', offset=cls.HEADER_SIZE, shape=(num_nodes, num_nodes))
+
+    @classmethod
+    def from_array(cls, matrix:np.ndarray, path:str, unreachable:int=UNREACHABLE_SPD, chunk_rows:int=1024):
+        """
+        Write SPD matrix (e.g. Floyd-Warshall result) into store.
+        Values >= `unreachable` (Floyd-Warshall's unreachable value is num_nodes + 1) are saved as `unreachable`.
+        """
+        num_nodes = matrix.shape[0]
+        body = cls.create(path, num_nodes, unreachable)
+        for start in range(0, num_nodes, chunk_rows):
+            chunk = np.asarray(matrix[start:start + chunk_rows])
+            body[start:start + chunk_rows] = np.minimum(chunk, unreachable)
+        body.flush()
+        del body
+
+        return cls(path)
+
+    def rows(self, sources) -> np.ndarray:
+        """
+        Distance rows of source ids, [len(sources), num_nodes] (same as `LazySPDTable.rows()`).
+        """
+        return np.asarray(self.matrix[np.asarray(sources, dtype=np.int64) - 1])
+
+    def gather(self, walk_ids) -> np.ndarray:
+        """
+        Slice [walk_len, walk_len] SPD matrices of random walk sequences at once.
+        Zero-padded id reads index -1 (last row/column), same as the previous `spd_table[seq - 1][:, seq - 1]` slicing.
+
+        Args:
+            walk_ids: user ids of random walks, [..., walk_len]
+
+        Returns:
+            [..., walk_len, walk_len] uint8 array
+        """
+        index = np.asarray(walk_ids, dtype=np.int64) - 1
+
+        return self.matrix[index[..., :, None], index[..., None, :]]
+
+def load_spd_store(data_path:str) -> SPDStore:
+    """
+    Open `shortest_path_result.spd` in `data_path`.
+    If only legacy `shortest_path_result.npy` exists, convert it to store first.
+    """
+    store_path = os.path.join(data_path, SPD_STORE_FILE)
+    if not os.path.isfile(store_path):
+        legacy_path = os.path.join(data_path, LEGACY_SPD_FILE)
+        if not os.path.isfile(legacy_path):
+            raise FileNotFoundError(f"No SPD store found in {data_path}, run `model_utils.find_shortest_path_distance()` first.")
+
+        print(f"Converting {LEGACY_SPD_FILE} to {SPD_STORE_FILE}...")
+        SPDStore.from_array(np.load(legacy_path, mmap_mode='r'), store_path)
+
+    return SPDStore(store_path)
+
+
+class RatingStore:
+    """
+    User-item rating matrix stored as CSR (`rating_matrix.npz`, scipy sparse format).
+    Only known ratings are kept, and missing (user, item) pairs read as 0, same as the previous dense matrix.
+    """
+    def __init__(self, matrix:sp.spmatrix):
+        matrix = sp.csr_matrix(matrix)
+        matrix.sum_duplicates()     # also sorts indices of each row
+
+        self.matrix = matrix
+        self.num_users, self.num_items = matrix.shape
+
+        # flat (user, item) key of each stored rating, sorted => vectorized binary search in `lookup()`
+        rows = np.repeat(np.arange(self.num_users, dtype=np.int64), np.diff(matrix.indptr))
+        self.keys = rows * self.num_items + matrix.indices
+        self.ratings = matrix.data
+
+    @classmethod
+    def load(cls, path:str):
+        return cls(sp.load_npz(path))
+
+    def save(self, path:str):
+        sp.save_npz(path, self.matrix)
+
+    @classmethod
+    def from_interactions(cls, users, items, ratings, shape=None, dtype=np.uint16):
+        """
+        Build store from columnar (user, item, rating) arrays at once.
+        For duplicated (user, item) pairs, the last rating is kept (same as assigning ratings row by row).
+
+        Args:
+            users: user ids, [num_ratings]
+            items: item ids, [num_ratings]
+            ratings: rating values, [num_ratings]
+            shape: (num_users, num_items) of matrix (default: max id + 1)
+        """
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        ratings = np.asarray(ratings)
+        if shape is None:
+            shape = (int(users.max(initial=0)) + 1, int(items.max(initial=0)) + 1)
+
+        # keep last occurrence of each (user, item): unique over reversed keys returns first index in reversed order
+        keys = users * shape[1] + items
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+
+        matrix = sp.csr_matrix((ratings[last].astype(dtype), (users[last], items[last])), shape=shape)
+        matrix.eliminate_zeros()    # rating 0 == unknown pair
+
+        return cls(matrix)
+
+    @classmethod
+    def from_dense(cls, matrix:np.ndarray, chunk_rows:int=1024):
+        """
+        Convert dense rating matrix (e.g. memory-mapped legacy `rating_matrix.npy`) chunk by chunk.
+        """
+        chunks = [sp.csr_matrix(np.asarray(matrix[start:start + chunk_rows])) for start in range(0, matrix.shape[0], chunk_rows)]
+
+        return cls(sp.vstack(chunks, format='csr'))
+
+    def lookup(self, users, items) -> np.ndarray:
+        """
+        Ratings of (user, item) pairs, e.g. [walk_len, item_seq_len] block with
+        `lookup(user_seq[:, None], item_list[None, :])`.
+
+        Args:
+            users: user ids (broadcastable with `items`)
+            items: item ids
+
+        Returns:
+            ratings with broadcasted shape of (users, items), 0 for unknown pairs & zero-padded ids
+        """
+        users, items = np.broadcast_arrays(np.asarray(users, dtype=np.int64), np.asarray(items, dtype=np.int64))
+        valid = (users >= 0) & (users < self.num_users) & (items >= 0) & (items < self.num_items)
+
+        keys = np.where(valid, users * self.num_items + items, -1)
+        if len(self.keys) == 0:
+            return np.zeros(keys.shape, dtype=self.ratings.dtype)
+
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = valid & (self.keys[position] == keys)
+
+        return np.where(found, self.ratings[position], 0).astype(self.ratings.dtype)
+
+def load_rating_store(data_path:str) -> RatingStore:
+    """
+    Open `rating_matrix.npz` in `data_path`.
+    If only legacy dense `rating_matrix.npy` exists, convert it to store first.
+    """
+    store_path = os.path.join(data_path, RATING_STORE_FILE)
+    if not os.path.isfile(store_path):
+        legacy_path = os.path.join(data_path, LEGACY_RATING_FILE)
+        if not os.path.isfile(legacy_path):
+            raise FileNotFoundError(f"No rating store found in {data_path}, run `data_utils.mat_to_csv()` first.")
+
+        print(f"Converting {LEGACY_RATING_FILE} to {RATING_STORE_FILE}...")
+        RatingStore.from_dense(np.load(legacy_path, mmap_mode='r')).save(store_path)
+
+    return RatingStore.load(store_path)
+
+
+def save_degree_lookup(table_path:str, degree:np.ndarray):
+    """
+    Save id-indexed degree array next to degree table (`degree_table_*.csv` => `degree_table_*.npy`).
+    """
+    np.save(os.path.splitext(table_path)[0] + '.npy', np.asarray(degree, dtype=np.int64))
+
+def load_degree_lookup(table_path:str) -> np.ndarray:
+    """
+    Id-indexed degree array of degree table (0 for ids not in table), e.g. `degree[walk]`.
+    If .npy array doesn't exist (table made before), it is built from `{user_id | product_id}, degree` columns of the .csv.
+    """
+    array_path = os.path.splitext(table_path)[0] + '.npy'
+    if os.path.isfile(array_path):
+        return np.load(array_path)
+
+    dataframe = pd.read_csv(table_path)
+    ids = dataframe.iloc[:, 0].values
+    degree = np.zeros(int(ids.max()) + 1 if len(ids) else 1, dtype=np.int64)
+    degree[ids] = dataframe['degree'].values
+    save_degree_lookup(table_path, degree)
+
+    return degree
+
+
+SAMPLE_STORE_VERSION = 1
+SAMPLE_SHARD_SIZE = 8192
+
+def sample_data_name(seed:int, random_walk_len:int, item_seq_len:int, return_params:int, split:str, compact:bool=False) -> str:
+    """
+    Name of final model input data (directory of sample store, or legacy `.pkl` without extension).
+    Compact stores (id sequences only) get `_compact` suffix, so full & compact stores of same setting coexist.
+    """
+    name = f'sequence_data_seed_{seed}_walk_{random_walk_len}_itemlen_{item_seq_len}_rp_{return_params}_{split}'
+
+    return name + '_compact' if compact else name
+
+# fields derived from id sequences & global tables (degree tables, SPD & rating stores), not stored in compact sample store
+DERIVED_SAMPLE_FIELDS = ['user_degree', 'item_degree', 'item_rating', 'spd_matrix']
+
+def sample_fields(random_walk_len:int, item_seq_len:int, compact:bool=False) -> dict:
+    """
+    Fixed-width (dtype, per-sample shape) of each sample field.
+    Field names are same as keys of `MyDataset.__getitem__()`.
+    Compact store only keeps id sequences (`DERIVED_SAMPLE_FIELDS` are gathered per batch, see `dataset.BlockCollate`).
+    """
+    fields = {
+        'user_id': ('<i4', ()),
+        'user_seq': ('<i4', (random_walk_len,)),
+        'user_degree': ('<i4', (random_walk_len,)),
+        'item_list': ('<i4', (item_seq_len,)),
+        'item_degree': ('<i4', (item_seq_len,)),
+        'item_rating': ('u1', (random_walk_len, item_seq_len)),
+        'spd_matrix': ('u1', (random_walk_len, random_walk_len)),
+    }
+    if compact:
+        fields = {name: spec for name, spec in fields.items() if name not in DERIVED_SAMPLE_FIELDS}
+
+    return fields
+
+class SampleStoreWriter:
+    """
+    Write samples into columnar sample store, keeping at most about `shard_size` samples in memory.
+
+    Directory layout:
+        manifest.json: fields (dtype, per-sample shape), number of samples of each shard, meta info
+        {field}-{shard:05d}.npy: [num_samples_in_shard, *shape] array of each field
+        progress.json: completed shards & input cursor while writing (removed by `close()`)
+
+    Buffered samples are flushed at the end of `append()` once `shard_size` is reached,
+    so a shard never splits samples of one `append()` call (e.g. all slices of one random walk).
+    With `resume=True`, shards completed by an interrupted run (same fields & meta) are kept,
+    and the caller continues from `writer.cursor`.
+    """
+    def __init__(self, path:str, fields:dict, shard_size:int=SAMPLE_SHARD_SIZE, meta:dict=None, resume:bool=False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fields = fields
+        self.shard_size = shard_size
+        self.meta = meta or {}
+
+        self.shards = []
+        self.cursor = 0
+        self.buffer = {name: [] for name in fields}
+        self.num_buffered = 0
+
+        # store is rewritten => previous manifest becomes invalid until `close()`
+        if os.path.isfile(os.path.join(path, 'manifest.json')):
+            os.remove(os.path.join(path, 'manifest.json'))
+        if resume:
+            self._load_progress()
+
+    def _field_specs(self) -> dict:
+        return {name: {'dtype': dtype, 'shape': list(shape)} for name, (dtype, shape) in self.fields.items()}
+
+    def _load_progress(self):
+        progress_path = os.path.join(self.path, 'progress.json')
+        if not os.path.isfile(progress_path):
+            return
+
+        with open(progress_path) as file:
+            progress = json.load(file)
+        if progress['fields'] != self._field_specs() or progress['meta'] != self.meta:
+            print(f"Progress of different settings found, restart writing: {self.path}")
+            return
+
+        self.shards = progress['shards']
+        self.cursor = progress['cursor']
+        print(f"Resume writing from cursor {self.cursor} ({len(self.shards)} shards, {sum(self.shards)} samples): {self.path}")
+
+    def _save_progress(self):
+        progress = {'fields': self._field_specs(), 'meta': self.meta, 'shards': self.shards, 'cursor': self.cursor}
+
+        # write & rename => progress file is never half-written
+        temp_path = os.path.join(self.path, 'progress.json.tmp')
+        with open(temp_path, 'w') as file:
+            json.dump(progress, file)
+        os.replace(temp_path, os.path.join(self.path, 'progress.json'))
+
+    def append(self, samples:dict, cursor:int=None):
+        """
+        Args:
+            samples: {field: [num_samples, *shape] array}, same number of samples for all fields
+            cursor: position in caller's input right after these samples (saved with flushed shard, for resuming)
+        """
+        num_samples = len(samples['user_id'])
+        for name, (dtype, shape) in self.fields.items():
+            values = np.asarray(samples[name])
+            if values.shape != (num_samples, *shape):
+                raise ValueError(f"Field `{name}` has shape {values.shape}, expected {(num_samples, *shape)}")
+            self.buffer[name].append(values.astype(dtype))
+        self.num_buffered += num_samples
+
+        if cursor is not None:
+            self.cursor = cursor
+        if self.num_buffered >= self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        shard_id = len(self.shards)
+        for name in self.fields:
+            np.save(os.path.join(self.path, f'{name}-{shard_id:05d}.npy'), np.concatenate(self.buffer[name]))
+            self.buffer[name] = []
+
+        self.shards.append(self.num_buffered)
+        self.num_buffered = 0
+        self._save_progress()
+
+    def close(self) -> 'SampleStore':
+        if self.num_buffered > 0:
+            self._flush()
+
+        manifest = {
+            'version': SAMPLE_STORE_VERSION,
+            'num_samples': sum(self.shards),
+            'fields': self._field_specs(),
+            'shards': self.shards,
+            'meta': self.meta,
+        }
+        # manifest is written last => store without manifest is incomplete
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as file:
+            json.dump(manifest, file, indent=4)
+
+        # remove progress & stale shards left by previous (longer) runs
+        shard_files = {f'{name}-{shard_id:05d}.npy' for name in self.fields for shard_id in range(len(self.shards))}
+        for file_name in os.listdir(self.path):
+            if (file_name.endswith('.npy') and file_name not in shard_files) or file_name == 'progress.json':
+                os.remove(os.path.join(self.path, file_name))
+
+        return SampleStore(self.path)
+
+class SampleStore:
+    """
+    Columnar sample store written by `SampleStoreWriter`, shards are opened as read-only np.memmap.
+    """
+    def __init__(self, path:str):
+        self.path = path
+
+        with open(os.path.join(path, 'manifest.json')) as file:
+            self.manifest = json.load(file)
+        if self.manifest['version'] != SAMPLE_STORE_VERSION:
+            raise ValueError(f"Unsupported sample store version {self.manifest['version']}: {path}")
+
+        self.fields = {name: (spec['dtype'], tuple(spec['shape'])) for name, spec in self.manifest['fields'].items()}
+        self.num_samples = self.manifest['num_samples']
+        # start index of each shard
+        self.offsets = np.cumsum([0] + self.manifest['shards'])
+        self._shard_starts = self.offsets.tolist()
+        # opened shards, {(field, shard id): np.memmap}
+        self._memmaps = {}
+
+    # opened memmaps are not pickled (e.g. sending to spawn/forkserver DataLoader workers), shards are re-opened on demand
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __len__(self):
+        return self.num_samples
+
+    def shard(self, shard_id:int) -> dict:
+        return {name: self.memmap(name, shard_id) for name in self.fields}
+
+    def memmap(self, name:str, shard_id:int) -> np.memmap:
+        """
+        Read-only memmap of field in shard (opened on first access, pages are read on demand).
+        """
+        key = (name, shard_id)
+        if key not in self._memmaps:
+            self._memmaps[key] = np.load(os.path.join(self.path, f'{name}-{shard_id:05d}.npy'), mmap_mode='r')
+
+        return self._memmaps[key]
+
+    def locate(self, indices) -> tuple:
+        """
+        Sample indices => (shard ids, indices within shard)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if np.any((indices < 0) | (indices >= self.num_samples)):
+            raise IndexError(f"Sample index out of range (num_samples: {self.num_samples})")
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+
+        return shard_ids, indices - self.offsets[shard_ids]
+
+    def sample(self, index:int, names:list=None) -> dict:
+        """
+        Fields of one sample, {field: array copied from memmap}.
+        """
+        if not 0 <= index < self.num_samples:
+            raise IndexError(f"Sample index out of range (num_samples: {self.num_samples})")
+        shard_id = bisect.bisect_right(self._shard_starts, index) - 1
+        local = index - self._shard_starts[shard_id]
+
+        return {name: np.array(self.memmap(name, shard_id)[local]) for name in (names or self.fields)}
+
+    def rows(self, name:str, indices) -> np.ndarray:
+        """
+        Field of samples, [len(indices), *shape] (one fancy-indexing read per shard).
+        """
+        dtype, shape = self.fields[name]
+        shard_ids, local = self.locate(indices)
+        out = np.empty((len(shard_ids), *shape), dtype=dtype)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self.memmap(name, int(shard_id))[local[mask]]
+
+        return out
+
+    def field(self, name:str) -> np.ndarray:
+        """
+        Whole [num_samples, *shape] array of field (read into memory).
+        """
+        dtype, shape = self.fields[name]
+        if len(self.manifest['shards']) == 0:
+            return np.zeros((0, *shape), dtype=dtype)
+
+        return np.concatenate([self.memmap(name, shard_id) for shard_id in range(len(self.manifest['shards']))])
+
+def convert_sample_pickle(pickle_path:str, path:str, shard_size:int=SAMPLE_SHARD_SIZE) -> SampleStore:
+    """
+    Convert legacy `.pkl` (DataFrame of lists & tensors, written by previous `generate_input_sequence_data()`) to sample store.
+    SPD values over 255 (Floyd-Warshall's unreachable value) are saved as `UNREACHABLE_SPD`, same as SPD store.
+    """
+    dataframe = pd.read_pickle(pickle_path)
+
+    user_seq = np.array(dataframe['user_sequences'].tolist(), dtype=np.int64)
+    item_list = np.array(dataframe['item_sequences'].tolist(), dtype=np.int64)
+    random_walk_len, item_seq_len = user_seq.shape[1], item_list.shape[1]
+
+    writer = SampleStoreWriter(path, sample_fields(random_walk_len, item_seq_len), shard_size=shard_size, meta={'source': os.path.basename(pickle_path)})
+    for start in range(0, len(dataframe), shard_size):
+        chunk = dataframe.iloc[start:start + shard_size]
+        writer.append({
+            'user_id': chunk['user_id'].values,
+            'user_seq': user_seq[start:start + shard_size],
+            'user_degree': np.array(chunk['user_degree'].tolist(), dtype=np.int64),
+            'item_list': item_list[start:start + shard_size],
+            'item_degree': np.array(chunk['item_degree'].tolist(), dtype=np.int64),
+            'item_rating': np.stack([np.asarray(x) for x in chunk['item_rating']]),
+            'spd_matrix': np.minimum(np.stack([np.asarray(x) for x in chunk['spd_matrix']]), UNREACHABLE_SPD),
+        })
+
+    return writer.close()
+
+def load_sample_store(data_path:str, name:str) -> SampleStore:
+    """
+    Open sample store `name` in `data_path`.
+    If only legacy `{name}.pkl` exists, convert it to store first.
+    """
+    store_path = os.path.join(data_path, name)
+    if not os.path.isfile(os.path.join(store_path, 'manifest.json')):
+        legacy_path = store_path + '.pkl'
+        if not os.path.isfile(legacy_path):
+            raise FileNotFoundError(f"No sample store `{name}` found in {data_path}, run `data_making.py` first.")
+
+        print(f"Converting {name}.pkl to sample store...")
+        convert_sample_pickle(legacy_path, store_path)
+
+    return SampleStore(store_path)
+
+
+#### Convert legacy .pkl files
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description='Convert legacy sequence_data_*.pkl files to sample store')
+    parser.add_argument("--dataset", type=str, default="ciao", help="ciao // epinions")
+    parser.add_argument("--shard_size", type=int, default=SAMPLE_SHARD_SIZE, help="number of samples per shard")
+    args = parser.parse_args()
+
+    data_path = os.path.join(os.getcwd(), 'dataset', args.dataset)
+    for pickle_path in sorted(glob.glob(os.path.join(data_path, 'sequence_data_*.pkl'))):
+        store_path = pickle_path[:-len('.pkl')]
+        if os.path.isfile(os.path.join(store_path, 'manifest.json')):
+            print(f"Sample store exists: {store_path}")
+            continue
+
+        store = convert_sample_pickle(pickle_path, store_path, shard_size=args.shard_size)
+        print(f"Converted {os.path.basename(pickle_path)}: {len(store)} samples")
@@ -1,4 +1,188 @@
+import os
 import sys
+import time
+
+import torch
+
+##############################################################################
+# DEVICE #
+##############################################################################
+
+def get_device(name='auto'):
+    """
+    auto (cuda if available, else cpu) // cpu // cuda // cuda:{index}
+    """
+    if name == 'auto':
+        name = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    return torch.device(name)
+
+def setup_cpu_threads(num_threads=0, num_interop_threads=0):
+    """
+    Intra-op (within one op, e.g. matmul) & inter-op (independent ops) thread pools of CPU backend (0: torch default).
+    Inter-op threads can only be set before first parallel work, so call this at startup.
+    """
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads > 0:
+        torch.set_num_interop_threads(num_interop_threads)
+
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+def batch_to_device(batch, device, non_blocking=False):
+    """
+    Move all tensors of batch dict to device.
+    """
+    return {key: value.to(device, non_blocking=non_blocking) if torch.is_tensor(value) else value for key, value in batch.items()}
+
+def autocast_context(device, precision='fp32'):
+    """
+    Mixed precision context of forward pass: fp32 (disabled) // bf16 (bfloat16 autocast, CPU & GPU).
+    bf16 keeps fp32 exponent range, so no loss scaling (GradScaler) is needed.
+    """
+    device = torch.device(device)
+    if precision not in ('fp32', 'bf16'):
+        raise ValueError(f"unknown precision: {precision} (fp32 // bf16)")
+    if precision == 'bf16' and device.type == 'cuda' and not torch.cuda.is_bf16_supported():
+        raise ValueError(f"bf16 is not supported on {torch.cuda.get_device_name(device)}")
+
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=precision == 'bf16')
+
+class DeviceTimer:
+    """
+    Elapsed time (ms) of device work, with CUDA events on GPU and wall-clock on CPU.
+        timer.start() ... timer.stop() => timer.total (accumulated over start/stop pairs)
+    """
+    def __init__(self, device):
+        self.device = torch.device(device)
+        self.total = 0.0
+
+    def start(self):
+        if self.device.type == 'cuda':
+            self._start = torch.cuda.Event(enable_timing=True)
+            self._end = torch.cuda.Event(enable_timing=True)
+            self._start.record()
+        else:
+            self._start = time.perf_counter()
+
+    def stop(self):
+        if self.device.type == 'cuda':
+            self._end.record()
+            torch.cuda.synchronize(self.device)
+            elapsed = self._start.elapsed_time(self._end)
+        else:
+            elapsed = (time.perf_counter() - self._start) * 1000
+        self.total += elapsed
+
+        return elapsed
+
+def compile_model(model, backend='inductor', mode=None, max_shapes=8):
+    """
+    Compile forward of model in place (`nn.Module.compile`, state_dict keys unchanged) with static shapes.
+    Each new input shape (and train/eval mode) is compiled once, so batches should come in at most `max_shapes` shapes
+    (e.g. `--bucketing` with static shape buckets); beyond the cache limit, torch falls back to eager mode.
+    """
+    import torch._dynamo
+
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, max_shapes)
+    torch._dynamo.config.accumulated_cache_size_limit = max(torch._dynamo.config.accumulated_cache_size_limit, max_shapes)
+    model.compile(backend=backend, mode=mode, dynamic=False)
+
+    return model
+
+class ShapeTimer:
+    """
+    Step time (ms) per input shape: first step of each new shape includes compilation (`torch.compile`),
+    following steps are steady-state.
+        timer.start() ... timer.stop(shape)
+    """
+    def __init__(self, device):
+        self.timer = DeviceTimer(device)
+        self.shapes = set()
+        self.compile_time = 0.0
+        self.steady_time = 0.0
+        self.steady_steps = 0
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self, shape):
+        elapsed = self.timer.stop()
+        if shape in self.shapes:
+            self.steady_time += elapsed
+            self.steady_steps += 1
+        else:
+            self.shapes.add(shape)
+            self.compile_time += elapsed
+
+        return elapsed
+
+    def summary(self) -> str:
+        steady_step = self.steady_time / max(self.steady_steps, 1)
+        return (f"compile (first step of {len(self.shapes)} shapes): {self.compile_time / 1000:.2f}s, "
+                f"steady-state step: {steady_step:.2f}ms ({self.steady_steps} steps)")
+
+def device_memory(device):
+    """
+    Peak & current memory usage (MB) of device: CUDA allocator stats on GPU, process RSS on CPU.
+    """
+    device = torch.device(device)
+    if device.type == 'cuda':
+        stats = torch.cuda.memory_stats(device)
+        return {'peak': stats['active_bytes.all.peak'] >> 20, 'allocated': stats['active_bytes.all.allocated'] >> 20}
+
+    memory = process_memory()
+
+    return {'peak': memory.get('peak_rss', memory['rss']), 'allocated': memory['rss']}
+
+def reset_peak_memory(device):
+    """
+    Reset peak memory of `device_memory()` to current usage: CUDA allocator peak on GPU, process peak RSS (VmHWM, Linux) on CPU.
+    On CPU, freed heap memory kept by glibc malloc is released first (otherwise reused without raising RSS).
+    """
+    device = torch.device(device)
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+    elif os.path.isfile('/proc/self/clear_refs'):
+        import ctypes
+        try:
+            ctypes.CDLL('libc.so.6').malloc_trim(0)
+        except (OSError, AttributeError):    # non-glibc
+            pass
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+
+##############################################################################
+# MEMORY USAGE #
+##############################################################################
+
+def process_memory(pid=None):
+    """
+    Memory usage (MB) of process (default: current process), from /proc/[pid]/status.
+        rss: resident memory
+        shared: shared memory & file pages (e.g. shared tensors, memory-mapped files), not duplicated across workers
+        private: anonymous pages, i.e. pages copied on write in forked DataLoader workers
+    Only peak rss is available on non-Linux platforms.
+    """
+    status_path = f'/proc/{pid or "self"}/status'
+    if not os.path.isfile(status_path):
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': peak_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)}
+
+    status = {}
+    with open(status_path) as file:
+        for line in file:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM', 'RssAnon', 'RssFile', 'RssShmem'):
+                status[key] = int(value.split()[0]) / 1024
+
+    return {
+        'rss': status.get('VmRSS', 0),
+        'peak_rss': status.get('VmHWM', 0),
+        'shared': status.get('RssFile', 0) + status.get('RssShmem', 0),
+        'private': status.get('RssAnon', 0),
+    }
 
 ##############################################################################
 # REDIRECT LOGGER #